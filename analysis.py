@@ -1,82 +1,132 @@
 import numpy as np
-import requests
 from collections import Counter
+import lastfm
 
 def get_bio(artist_name):
-    last_api = '9ba91375b3fa52ccffec116c0656f908'
-    url = f"http://ws.audioscrobbler.com/2.0/?method=artist.getinfo&artist={artist_name}&api_key={last_api}&format=json"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        if 'artist' in data and 'bio' in data['artist']:
-            bio_summary = data['artist']['bio']['summary']
-            return bio_summary
-    return None
+    return lastfm.get_bio(artist_name)
 
 def get_tags(artist_name):
-    last_api = '9ba91375b3fa52ccffec116c0656f908'
-    url = f"http://ws.audioscrobbler.com/2.0/?method=artist.gettoptags&artist={artist_name}&api_key={last_api}&format=json"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        if 'toptags' in data and 'tag' in data['toptags']:
-            top_tags = [tag['name'] for tag in data['toptags']['tag']][:10] # Get Top 10 Tags
-            return top_tags
-    return None
+    return lastfm.get_tags(artist_name)
 
 import anthropic
 import os
+from genre_map import general_genres, genre_column
 
-def analyze(data):
+def genre_matrix(data):
+    # Tracks x general genres membership, columns in organize priority order
+    matrix = np.zeros((len(data), len(general_genres)), dtype=bool)
+    for row, track in enumerate(data):
+        matrix[row, [genre_column(g) for g in track['genres']]] = True
+    return matrix
+
+def primary_genres(matrix):
+    # Index of the highest-priority genre per track, tracks without any genre fall back to Others
+    first = matrix.argmax(axis=1)
+    return np.where(matrix.any(axis=1), first, general_genres.index('Others'))
+
+def genre_cooccurrence(matrix):
+    # Entry [i, j] counts the tracks tagged with both genres, the diagonal is the per-genre count
+    as_int = matrix.astype(np.int32)
+    return as_int.T @ as_int
+
+def top_genre_pairs(cooccurrence, n=5):
+    upper = np.triu(cooccurrence, k=1)
+    order = np.argsort(upper, axis=None, kind='stable')[::-1][:n]
+    rows, cols = np.unravel_index(order, upper.shape)
+    return [(general_genres[i], general_genres[j], int(upper[i, j])) for i, j in zip(rows, cols) if upper[i, j] > 0]
+
+STAT_FEATURES = ['track_popularity', 'tempo', 'valence', 'acousticness', 'energy', 'danceability']
+PERCENTILES = [10, 25, 50, 75, 90]
+
+def feature_matrix(data):
+    # Tracks x STAT_FEATURES, built once and shared by every statistic
+    return np.array([[track[k] for k in STAT_FEATURES] for track in data], dtype=np.float64).reshape(len(data), len(STAT_FEATURES))
+
+def release_decades(data):
+    # Decade per track, 0 for tracks without a release year
+    return np.array([track['release_year'] for track in data], dtype=np.int64) // 10 * 10
+
+def grouped_means(features, groups, n_groups):
+    # Per-group counts and feature means with one scatter-add, groups come from np.unique so none are empty
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.zeros((n_groups, features.shape[1]))
+    np.add.at(sums, groups, features)
+    return counts, sums / counts[:, None]
+
+def by_feature(row):
+    return dict(zip(STAT_FEATURES, np.round(row, 4).tolist()))
+
+def library_stats(data, matrix=None):
+    # Summary, percentile, per-genre and per-decade statistics as a JSON-ready dict
+    if matrix is None:
+        matrix = genre_matrix(data)
+    return column_stats(feature_matrix(data), matrix, release_decades(data))
+
+def column_stats(features, matrix, decades):
+    # library_stats over prebuilt columns, e.g. the memory-mapped library: tracks x STAT_FEATURES, the genre
+    # matrix and the decade of every track
+    if len(features) == 0:
+        return {'count': 0, 'features': {k: {} for k in STAT_FEATURES}, 'by_genre': {}, 'by_decade': {}, 'genre_pairs': []}
+    percentiles = np.percentile(features, PERCENTILES, axis=0)
+    summary = {'mean': features.mean(axis=0), 'std': features.std(axis=0), 'median': percentiles[PERCENTILES.index(50)]}
+    summary.update({f'p{p}': row for p, row in zip(PERCENTILES, percentiles)})
+    by_stat = {stat: by_feature(row) for stat, row in summary.items()}
+    stats = {
+        'count': len(features),
+        'features': {k: {stat: by_stat[stat][k] for stat in by_stat} for k in STAT_FEATURES},
+        'by_genre': {},
+        'by_decade': {},
+        'genre_pairs': [{'genres': [a, b], 'count': n} for a, b, n in top_genre_pairs(genre_cooccurrence(matrix))],
+    }
+
+    genre_counts = matrix.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        genre_means = (matrix.T.astype(np.float64) @ features) / genre_counts[:, None]
+    for i, genre in enumerate(general_genres):
+        if genre_counts[i]:
+            stats['by_genre'][genre] = {'count': int(genre_counts[i]), 'mean': by_feature(genre_means[i])}
+
+    decades, groups = np.unique(decades, return_inverse=True)
+    decade_counts, decade_means = grouped_means(features, groups.ravel(), len(decades))
+    for i, decade in enumerate(decades.tolist()):
+        stats['by_decade'][f'{decade}s' if decade else 'Unknown'] = {'count': int(decade_counts[i]), 'mean': by_feature(decade_means[i])}
+    return stats
+
+def genre_timeline(added_at, matrix):
+    # Month x genre counts of when tracks were saved and their running totals, months in chronological order
+    months, groups = np.unique([date[:7] for date in added_at] or np.zeros(0, dtype=str), return_inverse=True)
+    counts = np.zeros((len(months), matrix.shape[1]), dtype=np.int64)
+    np.add.at(counts, groups.ravel(), matrix.astype(np.int64))
+    return {'months': months.tolist(), 'genres': general_genres, 'cumulative': counts.cumsum(axis=0).tolist()}
+
+def analyze(data, stats=None):
     # print(data[0])
-    genres = [y for x in data for y in x['genres']]
-    counter = Counter(genres)
-    fav_genres = counter.most_common(5)
+    matrix = genre_matrix(data)
+    return summarize(matrix, [track['artist_names'] for track in data], stats or library_stats(data, matrix))
+
+def summarize(matrix, artist_names, stats):
+    counts = matrix.sum(axis=0)
+    ranked = np.argsort(-counts, kind='stable')[:5]
+    fav_genres = [(general_genres[i], int(counts[i])) for i in ranked if counts[i] > 0]
+    genre_pairs = [tuple(pair['genres']) + (pair['count'],) for pair in stats['genre_pairs']]
     artists = []
-    for track in data:
-        artist_names = track['artist_names'].split(',')
-        artists.extend(artist_names)
+    for names in artist_names:
+        artists.extend(names.split(','))
     counter = Counter(artists)
     fav_artists = counter.most_common(10)
     top_genres = ', '.join([genre[0] for genre in fav_genres])
     top_artists = ', '.join([artist[0] for artist in fav_artists])
     top_tags = ''
+    artist_tags = lastfm.get_tags_many([artist[0] for artist in fav_artists])
     for artist in fav_artists:
-        tags = get_tags(artist[0])
+        tags = artist_tags[artist[0]]
         if tags:  # Check if tags is not None
             top_tags += f'{artist[0]}: '
             top_tags += ', '.join(tags)
             top_tags += '\n'
     
-    popular = np.array([x['track_popularity'] for x in data])
-    pop_mean = np.mean(popular)
-    pop_median = np.median(popular)
-    pop_std = np.std(popular)
-
-    tempo = np.array([x['tempo'] for x in data])
-    tempo_mean = np.mean(tempo)
-    tempo_median = np.median(tempo)
-    tempo_std = np.std(tempo)
-
-    valence = np.array([x['valence'] for x in data])
-    valence_mean = np.mean(valence)
-    valence_median = np.median(valence)
-    valence_std = np.std(valence)
-
-    acousticness = np.array([x['acousticness'] for x in data])
-    acousticness_mean = np.mean(acousticness)
-    acousticness_median = np.median(acousticness)
-    acousticness_std = np.std(acousticness)
-
-    energy = np.array([x['energy'] for x in data])
-    energy_mean = np.mean(energy)
-    energy_median = np.median(energy)
-    energy_std = np.std(energy)
-
-    danceability = np.array([x['danceability'] for x in data])
-    danceability_mean = np.mean(danceability)
-    danceability_median = np.median(danceability)
-    danceability_std = np.std(danceability)
+    pop, tempo, valence = (stats['features'][k] for k in ('track_popularity', 'tempo', 'valence'))
+    acousticness, energy, danceability = (stats['features'][k] for k in ('acousticness', 'energy', 'danceability'))
     
     return 'unavailable'
 
@@ -84,15 +134,16 @@ def analyze(data):
     #     f'Information helpful for describing my music taste: '
     #     f'My top 5 genres are {top_genres}. My top 10 artists are {top_artists}.'
     #     f'Top tags associated with my top artists are {top_tags}.'
+    #     f'Genres that most often appear together in my songs are {genre_pairs}.'
     #     f'Here are the song metadata analysis statistics: '
     #     f'(Cite numeric data to prove your points and be insightful about standard deviation which represents how well spread and diverse my tastes are)'
     #     f"(Analyze deeper, don't just report the facts directly, connect the dots with my top genres and artists, engage your audience)"
-    #     f'Popularity (out of 100, with higher score being more popular): Mean - {pop_mean}, Median - {pop_median}, Std - {pop_std}. '
-    #     f'Tempo (in BPM): Mean - {tempo_mean}, Median - {tempo_median}, Std - {tempo_std}. '
-    #     f'Valence (a measure from 0.0 to 1.0 describing the musical positiveness conveyed by a track. Tracks with high valence sound more positive (e.g. happy, cheerful, euphoric), while tracks with low valence sound more negative (e.g. sad, depressed, angry)): Mean - {valence_mean}, Median - {valence_median}, Std - {valence_std}. '
-    #     f'Acousticness (A confidence measure from 0.0 to 1.0 of whether the track is acoustic): Mean - {acousticness_mean}, Median - {acousticness_median}, Std - {acousticness_std}. '
-    #     f'Energy (a measure from 0.0 to 1.0 and represents perceptual intensity and activity. Typically, energetic tracks feel fast, loud, and noisy): Mean - {energy_mean}, Median - {energy_median}, Std - {energy_std}. '
-    #     f'Danceability (describes how suitable a track is for dancing. A value of 0.0 is least danceable and 1.0 is most danceable.): Mean - {danceability_mean}, Median - {danceability_median}, Std - {danceability_std}. '
+    #     f'Popularity (out of 100, with higher score being more popular): Mean - {pop["mean"]}, Median - {pop["median"]}, Std - {pop["std"]}. '
+    #     f'Tempo (in BPM): Mean - {tempo["mean"]}, Median - {tempo["median"]}, Std - {tempo["std"]}. '
+    #     f'Valence (a measure from 0.0 to 1.0 describing the musical positiveness conveyed by a track. Tracks with high valence sound more positive (e.g. happy, cheerful, euphoric), while tracks with low valence sound more negative (e.g. sad, depressed, angry)): Mean - {valence["mean"]}, Median - {valence["median"]}, Std - {valence["std"]}. '
+    #     f'Acousticness (A confidence measure from 0.0 to 1.0 of whether the track is acoustic): Mean - {acousticness["mean"]}, Median - {acousticness["median"]}, Std - {acousticness["std"]}. '
+    #     f'Energy (a measure from 0.0 to 1.0 and represents perceptual intensity and activity. Typically, energetic tracks feel fast, loud, and noisy): Mean - {energy["mean"]}, Median - {energy["median"]}, Std - {energy["std"]}. '
+    #     f'Danceability (describes how suitable a track is for dancing. A value of 0.0 is least danceable and 1.0 is most danceable.): Mean - {danceability["mean"]}, Median - {danceability["median"]}, Std - {danceability["std"]}. '
     # )
 
     # client = anthropic.Anthropic(
@@ -1,26 +1,114 @@
-from flask import Flask, redirect, request, session, url_for, render_template,jsonify
+from flask import Flask, Response, redirect, request, session, url_for, render_template,jsonify
 from spotipy.oauth2 import SpotifyOAuth
 import spotipy
 from datetime import datetime
+import gzip
+import hashlib
 import json
 import numpy as np
 import os
 import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from flask_session import Session
+try:
+    import brotli  # Optional, responses fall back to gzip without it
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = './flask_session/'  # Ensure this directory exists
-app.config['SESSION_FILE_THRESHOLD'] = 100  # Max number of files before cleanup
-Session(app)
+# 'cookie' keeps only the user id in a signed cookie (needs SECRET_KEY), 'redis' and 'filesystem' use Flask-Session.
+# Spotify tokens never live in the session, see load_token
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie' if os.getenv('SECRET_KEY') else 'filesystem')
+app.secret_key = os.getenv('SECRET_KEY')
+if SESSION_BACKEND == 'redis':
+    from cache_backend import redis_client
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis_client()
+    Session(app)
+elif SESSION_BACKEND == 'filesystem':
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['SESSION_FILE_DIR'] = os.getenv('SESSION_FILE_DIR', './flask_session/')
+    # 0 turns off count-based pruning, which dropped arbitrary live sessions once 100 files existed
+    app.config['SESSION_FILE_THRESHOLD'] = int(os.getenv('SESSION_FILE_THRESHOLD', 0))
+    Session(app)
 
 REDIRECT_URL = f"https://www.genrify.us/callback"
 SCOPE = 'user-library-read playlist-read-private playlist-modify-private playlist-modify-public'
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', 8))  # Max saved-track pages in flight, 1 = sequential walk
+RECONCILE_INTERVAL = int(os.getenv('RECONCILE_INTERVAL', 7 * 24 * 3600))  # Seconds between full library re-fetches
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', 8))  # Enrichment requests in flight across all jobs
+MIN_PLAYLIST_TRACKS = 10
+PLAYLIST_CONCURRENCY = int(os.getenv('PLAYLIST_CONCURRENCY', 4))  # Playlists created or synced at once per job
+ASYNC_JOBS = os.getenv('ASYNC_JOBS', '0') == '1'  # Run Spotify-bound stages on the shared asyncio loop
+JOB_EVENTS_TIMEOUT = int(os.getenv('JOB_EVENTS_TIMEOUT', 20))  # Seconds a /job_events long poll may hold a worker thread
+JOB_EVENTS_RETRY = 500  # Milliseconds the browser waits before reconnecting to /job_events
+STATUS_FILE_POLL = 1  # Seconds between status file checks for jobs the registry does not know
+LEAN_TRACKS = os.getenv('LEAN_TRACKS', '1') == '1'  # Cache saved tracks projected to the fields the pipeline reads
+RAW_TRACK_ARCHIVE = os.getenv('RAW_TRACK_ARCHIVE', '0') == '1'  # Also append the raw pages to {user_id}_raw.jsonl
+STREAM_CHUNK = int(os.getenv('STREAM_CHUNK', 500))  # Tracks enriched and written together by the streaming analysis
+
+enrich_pool = ThreadPoolExecutor(max_workers=ENRICH_CONCURRENCY)  # Shared so the cap holds process-wide
+
+TRACK_FIELDS = ['id', 'track_name', 'artist_names', 'album_name', 'added_at', 'release_year', 'track_popularity']
+TRACK_PAGE_SIZE = 50
+TRACK_PAGE_MAX = 500
+TRACK_VIEW_USERS = int(os.getenv('TRACK_VIEW_USERS', 32))  # Lean track lists kept in memory for /api/tracks
+track_views = OrderedDict()
+track_views_lock = threading.Lock()
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # Bytes below which responses are sent as is
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+
+@app.before_request
+def track_cache_access():
+    # Recency for the cache manager's LRU, the sweeper starts with the first request of each worker
+    from cache_manager import cache_manager
+    cache_manager.start_sweeper()
+    if 'user_id' in session:
+        cache_manager.touch(session['user_id'])
+
+@app.after_request
+def compress(response):
+    # br when the client and server both support it, gzip otherwise, only for complete responses above the threshold
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if brotli is not None and 'br' in request.accept_encodings:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def file_etag(*paths, key=b''):
+    # Weak validator from the mtime and size of every file a response is built from
+    digest = hashlib.sha1(key)
+    for path in paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        digest.update(f'{path}:{stat.st_mtime_ns:x}-{stat.st_size:x};'.encode() if stat else f'{path}:-;'.encode())
+    return digest.hexdigest()[:24]
+
+def conditional(etag, build):
+    # 304 when the client already holds this version, otherwise build() the response and tag it
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = app.make_response(build())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/')
 def index():
-    logged_in = 'token_info' in session and 'access_token' in session['token_info']
+    logged_in = current_token() is not None
     sp_oauth = SpotifyOAuth(
         client_id=os.getenv('CLIENT_ID'),
         client_secret=os.getenv('CLIENT_SECRET'),
@@ -39,29 +127,83 @@ def callback():
         scope=SCOPE,
     )
     token_info = sp_oauth.get_access_token(request.args.get('code'))
-    session['token_info'] = token_info
     access_token = token_info['access_token']
     if sp_oauth.is_token_expired(token_info):
         token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-        session['token_info'] = token_info
         access_token = token_info['access_token']
     sp = spotipy.Spotify(auth=access_token)
     user_profile = sp.current_user()
+    save_token(user_profile['id'], token_info)
     session['user_id'] = user_profile['id']
     return redirect(url_for('index'))
 
 @app.route('/logout')
 def logout():
-    session.pop('token_info', None)
+    if 'user_id' in session:
+        save_token(session['user_id'], None)
     session.clear()
     return redirect('https://accounts.spotify.com/en/logout')
 
+TOKEN_TTL = int(os.getenv('TOKEN_TTL', 30 * 24 * 3600))  # Seconds a stored Spotify token outlives its last login
+
+def token_store():
+    from cache_backend import shared_store
+    return shared_store('tokens', TOKEN_TTL)
+
+def load_token(user_id):
+    # Tokens live next to the user's cache files, or in Redis when workers share it
+    store = token_store()
+    if store is not None:
+        return store.get(user_id)
+    token_file = f"./cache/{user_id}_token.json"
+    if os.path.exists(token_file):
+        with open(token_file, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_token(user_id, token_info):
+    store = token_store()
+    if store is not None:
+        if token_info is None:
+            store.delete(user_id)
+        else:
+            store.set(user_id, token_info)
+        return
+    token_file = f"./cache/{user_id}_token.json"
+    if token_info is None:
+        if os.path.exists(token_file):
+            os.remove(token_file)
+        return
+    with open(token_file, 'w') as f:
+        json.dump(token_info, f)
+
+def current_token():
+    # Token of the logged-in user, None when logged out
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    if 'token_info' in session:  # Sessions from before tokens moved server-side
+        save_token(user_id, session.pop('token_info'))
+    token_info = load_token(user_id)
+    return token_info if token_info and 'access_token' in token_info else None
+
+RELEASE_PRECISIONS = {10: 'day', 7: 'month', 4: 'year'}
+
+def release_year(release_date, precision=None):
+    # "YYYY[-MM[-DD]]" -> (year, precision) by slicing, year 0 with precision 'unknown' when there is no usable year
+    year = release_date[:4] if release_date else ''
+    if not year.isdigit() or int(year) == 0:
+        return 0, 'unknown'
+    return int(year), precision or RELEASE_PRECISIONS.get(len(release_date), 'unknown')
+
 def simplify_data(data):
     return [
         {
             'added_at': entry['added_at'][:10],
             'album_name': track['album']['name'],
             'album_release_date': track['album']['release_date'],
+            **dict(zip(('release_year', 'release_date_precision'),
+                       release_year(track['album']['release_date'], track['album'].get('release_date_precision')))),
             'artist_names': ', '.join(artist['name'] for artist in track['artists']),
             'artist_id': track['artists'][0]['id'],
             'track_name': track['name'],
@@ -70,147 +212,616 @@ def simplify_data(data):
         } for entry in data for track in [entry['track']]
     ]
 
-def enrich_data(data, sp):
-    chunk_size = 50  # Spotify API batch limit
-    for i in range(0, len(data), chunk_size):
-        track_chunk = data[i:i+chunk_size]
-        artist_ids = [track['artist_id'] for track in track_chunk]
-        artists = sp.artists(artist_ids)['artists']
-        features = sp.audio_features([track['id'] for track in track_chunk])
-        for track, artist, feature in zip(track_chunk, artists, features):
-            track['genres'] = artist.get('genres', [])
-            feature_data = {k: feature.get(k, 0) for k in [
-                'acousticness', 'danceability', 'energy', 'instrumentalness', 
-                'liveness', 'loudness', 'speechiness', 'tempo', 'valence', 
-                'key', 'mode', 'time_signature']}
-            track.update(feature_data)
+FEATURE_KEYS = ['acousticness', 'danceability', 'energy', 'instrumentalness',
+                'liveness', 'loudness', 'speechiness', 'tempo', 'valence',
+                'key', 'mode', 'time_signature']
+
+def artist_genres_from(artist_ids, artists):
+    return {artist_id: (artist or {}).get('genres', []) for artist_id, artist in zip(artist_ids, artists)}
+
+def audio_features_from(track_ids, features):
+    return {track_id: {k: (feature or {}).get(k, 0) for k in FEATURE_KEYS}
+            for track_id, feature in zip(track_ids, features)}
+
+def fetch_artist_genres(sp, artist_ids):
+    return artist_genres_from(artist_ids, sp.artists(artist_ids)['artists'])
+
+def fetch_audio_features(sp, track_ids):
+    return audio_features_from(track_ids, sp.audio_features(track_ids))
+
+def start_lookup(cache, ids, fetch, sp, chunk_size):
+    # Dedupe ids, serve hits from the shared cache and put the misses in flight on the enrich pool
+    unique_ids = list(dict.fromkeys(ids))
+    found = cache.get_many(unique_ids)
+    misses = [key for key in unique_ids if key not in found]
+    futures = [enrich_pool.submit(fetch, sp, misses[i:i+chunk_size]) for i in range(0, len(misses), chunk_size)]
+    return cache, found, futures
+
+def finish_lookup(lookup, label, progress=None, save=True):
+    cache, found, futures = lookup
+    hits = len(found)
+    for future in futures:
+        fetched = future.result()
+        cache.set_many(fetched)
+        found.update(fetched)
+        if progress:
+            progress(chunks_enriched=1)
+    if save:
+        cache.save()
+    print(f'{label}: {hits} cached, {len(found) - hits} fetched in {len(futures)} calls')
+    return found
+
+def enrich_data(data, sp, progress=None):
+    # Artist (50 ids) and feature (100 ids) batches for every chunk run concurrently under ENRICH_CONCURRENCY
+    from shared_cache import artist_genres, track_features
+    genre_lookup = start_lookup(artist_genres, [track['artist_id'] for track in data], fetch_artist_genres, sp, 50)
+    feature_lookup = start_lookup(track_features, [track['id'] for track in data], fetch_audio_features, sp, 100)
+    genres = finish_lookup(genre_lookup, 'artist genres', progress)
+    features = finish_lookup(feature_lookup, 'audio features', progress)
+    apply_enrichment(data, genres, features)
+
+def apply_enrichment(data, genres, features):
+    for track in data:
+        track['genres'] = genres.get(track['artist_id'], [])
+        track.update(features[track['id']])
         
-def bg_get_tracks(user_id,sp):
+def project_item(entry):
+    # Saved-track item reduced to what simplify_data and the sync read, same nesting as the API payload
+    track = entry['track']
+    album = track['album']
+    return {
+        'added_at': entry['added_at'],
+        'track': {
+            'id': track['id'],
+            'name': track['name'],
+            'popularity': track['popularity'],
+            'artists': [{'id': artist['id'], 'name': artist['name']} for artist in track['artists']],
+            'album': {'name': album['name'], 'release_date': album['release_date'],
+                      'release_date_precision': album.get('release_date_precision')},
+        },
+    }
+
+def page_items(page, archive=None):
+    # Items of a saved-tracks page as they get cached, projected as soon as the page arrives
+    if archive:
+        archive(page['items'])
+    if LEAN_TRACKS:
+        return [project_item(entry) for entry in page['items']]
+    return page['items']
+
+def raw_archive(user_id, rewrite=False):
+    # Callback appending raw pages to {user_id}_raw.jsonl, None unless RAW_TRACK_ARCHIVE is set.
+    # Full fetches pass rewrite=True so their first page truncates the file instead of adding a second copy
+    if not RAW_TRACK_ARCHIVE:
+        return None
+    lock = threading.Lock()
+    mode = 'w' if rewrite else 'a'
+
+    def archive(items):
+        nonlocal mode
+        with lock:
+            with open(f"./cache/{user_id}_raw.jsonl", mode) as f:
+                f.write(json.dumps(items) + '\n')
+            mode = 'a'
+    return archive
+
+def fetch_saved_tracks(sp, limit=50, progress=None, archive=None):
+    # Walk the liked songs one page at a time until 'next' is None
+    offset = 0
+    all_tracks = []
+    while True:
+        results = sp.current_user_saved_tracks(limit=limit, offset=offset)
+        all_tracks.extend(page_items(results, archive))
+        if progress:
+            progress(pages_fetched=1)
+        if results['next'] is None:
+            break
+        offset += limit
+    return all_tracks
+
+def fetch_saved_tracks_parallel(sp, limit=50, max_workers=FETCH_CONCURRENCY, progress=None, archive=None):
+    # Whole library as one list, the pages come from the same bounded window the streaming analysis uses
+    return [track for items in iter_saved_track_pages(sp, limit, max_workers, progress, archive) for track in items]
+
+def iter_saved_track_pages(sp, limit=50, max_workers=FETCH_CONCURRENCY, progress=None, archive=None):
+    # Yields lean pages in offset order while up to max_workers of the following pages are already in flight
+    def fetch_page(offset):
+        items = page_items(sp.current_user_saved_tracks(limit=limit, offset=offset), archive)
+        if progress:
+            progress(pages_fetched=1)
+        return items
+
+    first = sp.current_user_saved_tracks(limit=limit, offset=0)
+    if progress:
+        progress(pages_fetched=1)
+    yield page_items(first, archive)
+    if first['next'] is None:
+        return
+    offsets = iter(range(limit, first['total'], limit))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        window = deque(pool.submit(fetch_page, offset) for offset in islice(offsets, max_workers))
+        while window:
+            items = window.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                window.append(pool.submit(fetch_page, offset))
+            yield items
+
+def fetch_all_saved_tracks(sp, max_workers=FETCH_CONCURRENCY, progress=None, archive=None):
+    if max_workers > 1:
+        return fetch_saved_tracks_parallel(sp, max_workers=max_workers, progress=progress, archive=archive)
+    return fetch_saved_tracks(sp, progress=progress, archive=archive)
+
+def fetch_new_saved_tracks(sp, cached, limit=50, progress=None, archive=None):
+    # Saved tracks come back newest-first, so stop at the first (id, added_at) we already have
+    known = {(entry['track']['id'], entry['added_at']) for entry in cached}
+    offset = 0
+    new_tracks = []
+    while True:
+        results = sp.current_user_saved_tracks(limit=limit, offset=offset)
+        if progress:
+            progress(pages_fetched=1)
+        entries = page_items(results)
+        fresh = unseen_count(entries, known)
+        new_tracks.extend(entries[:fresh])
+        if archive and fresh:
+            archive(results['items'][:fresh])  # The archive already has everything from the first known entry on
+        if fresh < len(entries) or results['next'] is None:
+            return new_tracks, results['total']
+        offset += limit
+
+def unseen_count(entries, known):
+    # Length of the run of entries at the head of a page that are not cached yet
+    for n, entry in enumerate(entries):
+        if (entry['track']['id'], entry['added_at']) in known:
+            return n
+    return len(entries)
+
+def load_sync_state(user_id):
+    sync_file = f"./cache/{user_id}_sync.json"
+    if os.path.exists(sync_file):
+        with open(sync_file, 'r') as f:
+            return json.load(f)
+    return {'last_full_sync': 0}
+
+def save_sync_state(user_id, state):
+    with open(f"./cache/{user_id}_sync.json", 'w') as f:
+        json.dump(state, f)
+
+def job_progress(user_id, job_type):
+    # Progress callback for helpers that don't know which job they work for
+    from jobs import registry
+    return lambda **counters: registry.update(user_id, job_type, **counters)
+
+def report_stage(user_id, job_type, stage):
+    from jobs import registry
+    registry.update(user_id, job_type, stage=stage)
+
+def save_tracks(user_id, tracks):
+    with open(f"./cache/{user_id}.json", 'w') as f:
+        json.dump(tracks, f)
+
+def lean_tracks(cached):
+    # Caches written before lean ingestion are projected on their next sync, returns (tracks, changed)
+    if not LEAN_TRACKS:
+        return cached, False
+    projected = [project_item(entry) for entry in cached]
+    return projected, projected != cached
+
+def merge_new_tracks(cached, new_tracks):
+    # Returns the merged library and the ids that dropped out of it
+    new_ids = {entry['track']['id'] for entry in new_tracks}
+    merged = new_tracks + [entry for entry in cached if entry['track']['id'] not in new_ids]  # Re-liked songs move to the front
+    removed = {entry['track']['id'] for entry in cached} - {entry['track']['id'] for entry in merged}
+    return merged, removed
+
+def needs_reconcile(total, merged, state):
+    # Cheap reconciliation: a count mismatch or an old full sync means unlikes we can't see from the head
+    return total != len(merged) or time.time() - state['last_full_sync'] > RECONCILE_INTERVAL
+
+def diff_tracks(cached, fresh):
+    # Entries of a full fetch that are not cached, and cached ids the full fetch no longer has
+    cached_keys = {(entry['track']['id'], entry['added_at']) for entry in cached}
+    new_tracks = [entry for entry in fresh if (entry['track']['id'], entry['added_at']) not in cached_keys]
+    removed = {entry['track']['id'] for entry in cached} - {entry['track']['id'] for entry in fresh}
+    return new_tracks, removed
+
+def bg_get_tracks(user_id, sp, max_workers=FETCH_CONCURRENCY, job_type='get_tracks'):
     cache_file = f"./cache/{user_id}.json"
+    report_stage(user_id, job_type, 'fetching')
     if not os.path.exists(cache_file):
-        offset = 0
-        limit = 50
-        all_tracks = []
-        while True:
-            results = sp.current_user_saved_tracks(limit=limit, offset=offset)
-            all_tracks.extend(results['items'])
-            if results['next'] is None:
-                break
-            offset += limit
-        with open(cache_file, 'w') as f:
-            json.dump(all_tracks, f)
+        archive = raw_archive(user_id, rewrite=True)
+        all_tracks = fetch_all_saved_tracks(sp, max_workers, job_progress(user_id, job_type), archive)
+        save_tracks(user_id, all_tracks)
+        save_sync_state(user_id, {'last_full_sync': time.time()})
+        return None
+    return sync_tracks(user_id, sp, max_workers, job_type)
+
+def sync_tracks(user_id, sp, max_workers=FETCH_CONCURRENCY, job_type='get_tracks'):
+    # Delta sync of the liked songs cache, returns the added entries and removed track ids
+    cache_file = f"./cache/{user_id}.json"
+    with open(cache_file, 'r') as f:
+        cached, shrunk = lean_tracks(json.load(f))
+    archive = raw_archive(user_id)
+    new_tracks, total = fetch_new_saved_tracks(sp, cached, progress=job_progress(user_id, job_type), archive=archive)
+    merged, removed = merge_new_tracks(cached, new_tracks)
+    state = load_sync_state(user_id)
+    if needs_reconcile(total, merged, state):
+        archive = raw_archive(user_id, rewrite=True)  # The full fetch replaces the archive
+        merged = fetch_all_saved_tracks(sp, max_workers, job_progress(user_id, job_type), archive)
+        new_tracks, removed = diff_tracks(cached, merged)
+        state['last_full_sync'] = time.time()
+
+    if new_tracks or removed or shrunk or len(merged) != len(cached):
+        save_tracks(user_id, merged)
+    save_sync_state(user_id, state)
+    if new_tracks or removed:
+        update_analysis(user_id, sp, new_tracks, removed, job_type)
+    return {'added': new_tracks, 'removed': removed}
+
+def classify_genres(data):
+    from genre_map import convert_many
+    for track in data:
+        processed = list(set(convert_many(track['genres']))) # Niche Genres-> Mainstream Genres
+        if 'Others' in processed and len(processed) != 1:
+            processed.remove('Others')
+        track['genres'] = processed
+
+def save_analyzed(user_id, data):
+    # JSON stays the compatibility format, the columnar copy is what later stages map
+    from library_store import write_library
+    with open(f"./cache/{user_id}_AN.json", 'w') as f:
+        json.dump(data, f)
+    write_library(f"./cache/{user_id}_AN", data)
+
+def load_analyzed(user_id):
+    with open(f"./cache/{user_id}_AN.json", 'r') as f:
+        data = json.load(f)
+    for track in data:
+        if 'release_year' not in track:  # Analyses written before release years were stored
+            track['release_year'], track['release_date_precision'] = release_year(track['album_release_date'])
+    return data
+
+def load_library(user_id):
+    from library_store import open_library, write_library
+    library_dir = f"./cache/{user_id}_AN"
+    library = open_library(library_dir) if os.path.exists(library_dir) else None
+    if library is None or 'release_year' not in library.meta['numeric']:  # Written by an older format
+        write_library(library_dir, load_analyzed(user_id))
+        library = open_library(library_dir)
+    return library
+
+def library_version(user_id):
+    # Changes whenever the analyzed library is rewritten
+    stat = os.stat(f"./cache/{user_id}_AN.json")
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+RESULT_TTL = int(os.getenv('RESULT_TTL', 30 * 24 * 3600))  # Seconds shared analysis results outlive their last job
+
+def result_store():
+    from cache_backend import shared_store
+    return shared_store('results', RESULT_TTL)
+
+def shared_result(user_id, name):
+    # What another worker published for the user, None without a shared backend
+    store = result_store()
+    return store.get(f'{user_id}:{name}') if store is not None else None
+
+def share_results(user_id):
+    # Copies what /results and /api/tracks read from local disk into the shared store, so any worker can serve them
+    store = result_store()
+    if store is None:
+        return
+    if os.path.exists(f"./cache/{user_id}.json"):
+        view = load_track_view(user_id)
+        store.set(f'{user_id}:tracks', {'version': view['version'], 'tracks': view['tracks']})
+        store.set(f'{user_id}:tracks_version', view['version'])
+    an_text_file = f"./cache/{user_id}_AN-Text.json"
+    stats_file = f"./cache/{user_id}_AN-Stats.json"
+    if all(os.path.exists(path) for path in (f"./cache/{user_id}_AN.json", an_text_file, stats_file)):
+        with open(an_text_file, 'r') as f:
+            text = json.load(f)
+        with open(stats_file, 'r') as f:
+            stats = json.load(f)
+        store.set(f'{user_id}:analysis', {'version': library_version(user_id), 'text': text, 'stats': stats,
+                                          'timeline': load_timeline(user_id)})
+
+def load_timeline(user_id):
+    # Cumulative genre counts per month for the analytics chart, recomputed only for a new library version
+    from analysis import genre_timeline
+    from library_store import mask_to_matrix
+    timeline_file = f"./cache/{user_id}_AN-Timeline.json"
+    version = library_version(user_id)
+    if os.path.exists(timeline_file):
+        with open(timeline_file, 'r') as f:
+            timeline = json.load(f)
+        if timeline.get('version') == version:
+            return timeline
+    columns = load_library(user_id).columns(['added_at', 'genres'])
+    timeline = genre_timeline(columns['added_at'].tolist(), mask_to_matrix(columns['genres']))
+    timeline['version'] = version
+    with open(timeline_file, 'w') as f:
+        json.dump(timeline, f)
+    return timeline
+
+def update_analysis(user_id, sp, new_tracks, removed, job_type='get_tracks'):
+    # Patch the derived files in place instead of rebuilding them, only new tracks hit the API
+    ana_file = f"./cache/{user_id}_AN.json"
+    if not os.path.exists(ana_file):
+        return
+    data = load_analyzed(user_id)
+    added = simplify_data(new_tracks)
+    report_stage(user_id, job_type, 'enriching')
+    enrich_data(added, sp, job_progress(user_id, job_type))
+    classify_genres(added)
+    data = patch_analyzed(data, added, removed)
+    save_analyzed(user_id, data)
+    save_summary(user_id, data)
+
+def patch_analyzed(data, added, removed):
+    stale = removed | {track['id'] for track in added}
+    return added + [track for track in data if track['id'] not in stale]
+
+def save_summary(user_id, data):
+    from analysis import analyze, library_stats
+    stats = library_stats(data)
+    write_summary(user_id, stats, analyze(data, stats))
+
+def save_library_summary(user_id):
+    # Same files as save_summary, computed from the memory-mapped columns so no analyzed records are loaded
+    from analysis import STAT_FEATURES, column_stats, summarize
+    from library_store import mask_to_matrix
+    library = load_library(user_id)
+    matrix = mask_to_matrix(library.column('genres'))
+    features = np.column_stack([library.values(name) for name in STAT_FEATURES])
+    stats = column_stats(features, matrix, library.values('release_year') // 10 * 10)
+    write_summary(user_id, stats, summarize(matrix, library.column('artist_names').tolist(), stats))
+
+def write_summary(user_id, stats, text):
+    with open(f"./cache/{user_id}_AN-Stats.json", 'w') as f:
+        json.dump(stats, f)
+    with open(f"./cache/{user_id}_AN-Text.json", 'w') as f:
+        json.dump(text, f)
     
-def bg_analyze_tracks(user_id,sp):
+def chunked(pages, size):
+    # Regroups a stream of track lists into lists of about `size` tracks
+    chunk = []
+    for items in pages:
+        chunk.extend(items)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_analysis(user_id, sp, pages, track_writer=None, job_type='analyze_tracks'):
+    # Pages flow through simplify, enrichment and classification one chunk at a time and are appended to
+    # the analyzed outputs as they finish; fetching of later pages keeps running while a chunk is enriched
+    from library_store import JsonArrayWriter, LibraryWriter
+    from shared_cache import artist_genres, track_features
+    progress = job_progress(user_id, job_type)
+    json_writer = JsonArrayWriter(f"./cache/{user_id}_AN.json")
+    library_writer = LibraryWriter(f"./cache/{user_id}_AN")
+    for items in chunked(pages, STREAM_CHUNK):
+        if track_writer:
+            track_writer.append(items)
+        data = simplify_data(items)
+        genre_lookup = start_lookup(artist_genres, [track['artist_id'] for track in data], fetch_artist_genres, sp, 50)
+        feature_lookup = start_lookup(track_features, [track['id'] for track in data], fetch_audio_features, sp, 100)
+        genres = finish_lookup(genre_lookup, 'artist genres', progress, save=False)
+        features = finish_lookup(feature_lookup, 'audio features', progress, save=False)
+        apply_enrichment(data, genres, features)
+        classify_genres(data)
+        json_writer.append(data)
+        library_writer.append(data)
+    artist_genres.save()
+    track_features.save()
+    if track_writer:
+        track_writer.close()
+    json_writer.close()
+    library_writer.close()
+
+def bg_analyze_tracks(user_id, sp, job_type='analyze_tracks'):
+    from library_store import JsonArrayWriter, iter_json_array
     ana_file = f"./cache/{user_id}_AN.json"
     if not os.path.exists(ana_file):
         cache_file = f"./cache/{user_id}.json"
-        if not os.path.exists(cache_file):
-            bg_get_tracks(user_id, sp)
-        with open(cache_file, 'r') as f:
-            tracks = json.load(f)
-        data = simplify_data(tracks)
-        enrich_data(data, sp)
-        from genre_map import convert
-        for track in data:
-            processed = list(set(convert(g) for g in track['genres'])) # Niche Genres-> Mainstream Genres
-            if 'Others' in processed and len(processed) != 1:
-                processed.remove('Others')
-            track['genres'] = processed
-        with open(ana_file, 'w') as f:
-            json.dump(data, f)
-            
-    from analysis import analyze
+        report_stage(user_id, job_type, 'fetching and enriching')
+        if os.path.exists(cache_file):
+            # Read incrementally, so memory stays bounded by the chunks in flight on the warm path too
+            tracks = iter_json_array(cache_file)
+            stream_analysis(user_id, sp, iter(lambda: list(islice(tracks, STREAM_CHUNK)), []), job_type=job_type)
+        else:
+            # Cold start: the liked songs cache is written alongside the analysis instead of before it
+            pages = iter_saved_track_pages(sp, progress=job_progress(user_id, job_type),
+                                           archive=raw_archive(user_id, rewrite=True))
+            stream_analysis(user_id, sp, pages, JsonArrayWriter(cache_file), job_type)
+            save_sync_state(user_id, {'last_full_sync': time.time()})
+
+    report_stage(user_id, job_type, 'analyzing')
     an_text_file = f"./cache/{user_id}_AN-Text.json"
-    if not os.path.exists(an_text_file):
-        with open(ana_file, 'r') as f:
-            data = json.load(f)
-        ana_text = analyze(data)
-        with open(an_text_file, 'w') as f:
-            json.dump(ana_text, f)
-
-def bg_organize_tracks(user_id, sp):
-    bg_analyze_tracks(user_id, sp)
-    ana_file = f"./cache/{user_id}_AN.json"
-    with open(ana_file, 'r') as f:
-        data = json.load(f)
-    
-    # Initialize a dictionary to hold tracks categorized by decade and genre
-    categorized_tracks = {}
+    stats_file = f"./cache/{user_id}_AN-Stats.json"
+    if not os.path.exists(an_text_file) or not os.path.exists(stats_file):
+        save_library_summary(user_id)
 
-    for track in data:
-        # Get the genre
-        order = ["Soundtracks", "Classical", "Experimental", "Jazz", "Country/Folk", "Funk", "Rock", "RnB/Soul", "Indie", "Hip-Hop", "Electronic", "Pop", "Others"]
-        order = [genre for genre in order if genre in track['genres']]
-        genre = order[0] if order else 'Others'
-        
-        # Unclassified Genre
-        if genre == 'Others':
-            continue
-        
-        # Get the decade
-        try:
-            if len(track['album_release_date']) == 10:
-                year = datetime.strptime(track['album_release_date'], '%Y-%m-%d').year
-            elif len(track['album_release_date']) == 7:
-                year = datetime.strptime(track['album_release_date'], '%Y-%m').year
-            else:
-                year = datetime.strptime(track['album_release_date'], '%Y').year
-        except:
-            year = datetime.now().year
-        
-        decade = (year // 10) * 10
+def categorize_tracks(user_id, job_type='organize_tracks'):
+    # Track ids of the analyzed library grouped by "{decade}s {genre}", unclassified tracks are left out
+    from analysis import primary_genres
+    from genre_map import general_genres
+    from library_store import mask_to_matrix
+    library = load_library(user_id)
+    columns = library.columns(['id', 'release_year', 'genres'])
+    primary = primary_genres(mask_to_matrix(columns['genres']))
 
-        # Create a key based on genre and decade
-        key = f"{decade}s {genre}"
-        
-        if key not in categorized_tracks:
-            categorized_tracks[key] = []
-        
-        categorized_tracks[key].append(track['id'])
-
-    # Create playlists based on these categories
-    playlist_ids = {}
-    for key, tracks in categorized_tracks.items():
-        # Skip categories with fewer than 10 tracks
-        if len(tracks) < 10:
-            continue
-        
-        decade, genre = key.split(' ')
-        playlist_name = f'Genrified_{decade}_{genre.replace("/", "_")}'
-        playlist = sp.user_playlist_create(user=user_id, name=playlist_name, public=True)
-        playlist_ids[key] = playlist['id']
-        
-        # Add tracks to the playlist
-        batch_size = 50  # Spotify Rate Limit
-        for i in range(0, len(tracks), batch_size):
-            batch_tracks = tracks[i:i + batch_size]
-            sp.playlist_add_items(playlist_ids[key], batch_tracks)
+    # Tracks without a usable release year still go to the current decade, but now they are counted
+    years = np.asarray(columns['release_year'], dtype=np.int64)
+    undated = years == 0
+    if undated.any():
+        print(f'{int(undated.sum())} tracks without a release year filed under the current decade')
+        job_progress(user_id, job_type)(undated_tracks=int(undated.sum()))
+    decades = np.where(undated, datetime.now().year, years) // 10 * 10
 
+    # Group by (decade, genre) with one stable sort, buckets keep library order and first-seen order
+    keep = np.flatnonzero(primary != general_genres.index('Others'))
+    keys = decades[keep] * len(general_genres) + primary[keep]
+    order = np.argsort(keys, kind='stable')
+    _, starts = np.unique(keys[order], return_index=True)
+    groups = np.split(keep[order], starts[1:]) if len(keep) else []
+    ids = columns['id'].tolist()
+    return {f"{decades[group[0]]}s {general_genres[primary[group[0]]]}": [ids[i] for i in group]
+            for group in sorted(groups, key=lambda group: group[0])}
 
-def bg_delete_playlists(user_id,sp):
-    playlists = sp.current_user_playlists()
-    to_delete = []
-    while playlists:
-        for playlist in playlists['items']:
-            if playlist['name'].startswith('Genrified'):
-                to_delete.append(playlist['id'])
-        if playlists['next']:
-            playlists = sp.next(playlists)
+def playlist_name(key):
+    decade, genre = key.split(' ')
+    return f'Genrified_{decade}_{genre.replace("/", "_")}'
+
+def playlist_buckets(categorized_tracks):
+    # Playlist name -> track ids, categories with fewer than 10 tracks are skipped
+    return {playlist_name(key): tracks for key, tracks in categorized_tracks.items()
+            if len(tracks) >= MIN_PLAYLIST_TRACKS}
+
+def split_existing_playlists(playlists, buckets):
+    # First playlist per bucket name is kept in sync, duplicates and buckets that no longer exist are stale
+    existing = {}
+    stale = []
+    for playlist in playlists:
+        if playlist['name'] in buckets and playlist['name'] not in existing:
+            existing[playlist['name']] = playlist['id']
         else:
-            playlists = None
-    batch_size = 100 
-    for i in range(0, len(to_delete), batch_size):
-        batch = to_delete[i:i + batch_size]
-        for playlist_id in batch:
-            sp.user_playlist_unfollow(user_id, playlist_id)
-                    
+            stale.append(playlist['id'])
+    return existing, stale
+
+def playlist_diff(wanted, current):
+    # Only the difference is written: missing tracks in bucket order, and tracks that left the bucket
+    current_ids = set(current)
+    wanted_ids = set(wanted)
+    to_add = [track_id for track_id in dict.fromkeys(wanted) if track_id not in current_ids]
+    to_remove = [track_id for track_id in dict.fromkeys(current) if track_id not in wanted_ids]
+    return to_add, to_remove
+
+def find_genrified_playlists(sp):
+    found = []
+    playlists = sp.current_user_playlists(limit=50)
+    while playlists:
+        found.extend({'id': playlist['id'], 'name': playlist['name']} for playlist in playlists['items']
+                     if playlist['name'].startswith('Genrified_'))
+        playlists = sp.next(playlists) if playlists['next'] else None
+    return found
+
+def fetch_playlist_track_ids(sp, playlist_id):
+    track_ids = []
+    page = sp.playlist_items(playlist_id, fields='items(track(id)),next', limit=100, additional_types=['track'])
+    while page:
+        track_ids.extend(item['track']['id'] for item in page['items'] if item.get('track'))
+        page = sp.next(page) if page['next'] else None
+    return track_ids
+
+def sync_playlist(user_id, sp, name, wanted, playlist_id=None, job_type='organize_tracks', registry=None):
+    # Creates the playlist when it doesn't exist yet, then adds and removes the difference 100 items at a time
+    batch_size = 100  # Spotify's per-request item limit for playlist writes
+    if playlist_id is None:
+        playlist_id = sp.user_playlist_create(user=user_id, name=name, public=True)['id']
+        if registry is not None:
+            record_playlist(user_id, registry, name, playlist_id)
+        to_add, to_remove = list(dict.fromkeys(wanted)), []
+        job_progress(user_id, job_type)(playlists_created=1)
+    else:
+        to_add, to_remove = playlist_diff(wanted, fetch_playlist_track_ids(sp, playlist_id))
+        if to_add or to_remove:
+            job_progress(user_id, job_type)(playlists_updated=1)
+    for i in range(0, len(to_remove), batch_size):
+        sp.playlist_remove_all_occurrences_of_items(playlist_id, to_remove[i:i + batch_size])
+    for i in range(0, len(to_add), batch_size):
+        sp.playlist_add_items(playlist_id, to_add[i:i + batch_size])
+    return playlist_id
+
+def bg_organize_tracks(user_id, sp, job_type='organize_tracks'):
+    bg_analyze_tracks(user_id, sp, job_type)
+    buckets = playlist_buckets(categorize_tracks(user_id, job_type))
+
+    # Sync the Genrified_* playlists with the buckets, a re-run on an unchanged library only reads
+    report_stage(user_id, job_type, 'syncing playlists')
+    existing, stale = split_existing_playlists(find_genrified_playlists(sp), buckets)
+    registry = start_playlist_registry(user_id, existing, stale)
+    with ThreadPoolExecutor(max_workers=PLAYLIST_CONCURRENCY) as pool:
+        playlist_ids = list(pool.map(lambda name: sync_playlist(user_id, sp, name, buckets[name], existing.get(name),
+                                                                job_type, registry), buckets))
+        list(pool.map(lambda playlist_id: sp.current_user_unfollow_playlist(playlist_id), stale))
+    save_playlist_registry(user_id, dict(zip(buckets, playlist_ids)))
+    if stale:
+        job_progress(user_id, job_type)(playlists_deleted=len(stale))
+
+def load_playlist_registry(user_id):
+    # Playlist name -> id of everything the last organize run left behind, None before the first run
+    registry_file = f"./cache/{user_id}_playlists.json"
+    if os.path.exists(registry_file):
+        with open(registry_file, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_playlist_registry(user_id, playlists):
+    registry_file = f"./cache/{user_id}_playlists.json"
+    if playlists is None:
+        if os.path.exists(registry_file):
+            os.remove(registry_file)
+        return
+    tmp_file = f'{registry_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(playlists, f)
+    os.replace(tmp_file, registry_file)  # A run killed mid-write keeps the previous registry readable
+
+playlist_registry_lock = threading.Lock()
+
+def start_playlist_registry(user_id, existing, stale):
+    # Written before any playlist is touched: the kept playlists plus the stale ones, keyed by id until they are
+    # unfollowed, so an interrupted organize run never leaves Genrified playlists the registry doesn't know about
+    registry = {playlist_id: playlist_id for playlist_id in stale}
+    registry.update(existing)
+    save_playlist_registry(user_id, registry)
+    return registry
+
+def record_playlist(user_id, registry, name, playlist_id):
+    # Saved as soon as Spotify returns the id, before any tracks are added
+    with playlist_registry_lock:
+        registry[name] = playlist_id
+        save_playlist_registry(user_id, registry)
+
+def genrified_ids(page):
+    return [playlist['id'] for playlist in page['items'] if playlist['name'].startswith('Genrified')]
+
+def scan_genrified_playlists(sp):
+    # Fallback for users without a registry. Walks every page: batches left by older runs can sit below
+    # the user's own playlists
+    found = []
+    playlists = sp.current_user_playlists(limit=50)
+    while playlists:
+        found.extend(genrified_ids(playlists))
+        playlists = sp.next(playlists) if playlists['next'] else None
+    return found
+
+def bg_delete_playlists(user_id, sp, job_type='delete_playlists'):
+    report_stage(user_id, job_type, 'deleting playlists')
+    registry = load_playlist_registry(user_id)
+    to_delete = list(registry.values()) if registry is not None else scan_genrified_playlists(sp)
+
+    def unfollow(playlist_id):
+        sp.current_user_unfollow_playlist(playlist_id)
+        job_progress(user_id, job_type)(playlists_deleted=1)
+
+    with ThreadPoolExecutor(max_workers=PLAYLIST_CONCURRENCY) as pool:
+        list(pool.map(unfollow, to_delete))
+    save_playlist_registry(user_id, None)
 
 def background_job(user_id, token_info, job_type):
-    sp = spotipy.Spotify(auth=token_info['access_token'])
-    status_file = f"./cache/{user_id}_status.json"
+    from jobs import registry
+    from spotify_client import make_spotify
+    registry.update(user_id, job_type, state='running')
+    if ASYNC_JOBS:
+        # The job runs on the shared event loop, the executor tracks the returned future without a worker thread
+        import async_pipeline
+        return async_pipeline.submit_job(user_id, token_info['access_token'], job_type)
+    sp = make_spotify(token_info['access_token'])
     try:
-        with open(status_file, 'w') as f:
-            json.dump('pending', f)
         if job_type == 'get_tracks':
             bg_get_tracks(user_id, sp)                
         elif job_type == 'analyze_tracks':
@@ -219,26 +830,42 @@ def background_job(user_id, token_info, job_type):
             bg_organize_tracks(user_id, sp)
         elif job_type == 'delete_playlists':
             bg_delete_playlists(user_id, sp)
-        with open(status_file, 'w') as f:
-            json.dump('completed', f)
     except Exception as e:
+        finish_job(user_id, job_type, e)
+        return
+    finish_job(user_id, job_type)
+
+def finish_job(user_id, job_type, error=None):
+    from jobs import registry
+    status_file = f"./cache/{user_id}_status.json"
+    if error is None:
+        if job_type in ('get_tracks', 'analyze_tracks'):
+            share_results(user_id)  # Before the job reads as completed, so /results finds them on any worker
+        registry.update(user_id, job_type, state='completed')
+        with open(status_file, 'w') as f:  # Outlives the process, the registry does not
+            json.dump('completed', f)
+    else:
+        registry.update(user_id, job_type, state='error', error=str(error))
         with open(status_file, 'w') as f:
-            json.dump(f'error: {str(e)}', f)
+            json.dump(f'error: {str(error)}', f)
 
 @app.route('/start_task/<job_type>')
 def start_task(job_type):
-    if 'token_info' not in session or 'access_token' not in session['token_info']:
+    token_info = current_token()
+    if token_info is None:
         return redirect(url_for('index'))
     
     user_id = session['user_id']
-    token_info = session['token_info']
     status_file = f"./cache/{user_id}_status.json"
     
     with open(status_file, 'w') as f:
         json.dump('pending', f)
     
-    thread = threading.Thread(target=background_job, args=(user_id, token_info, job_type))
-    thread.start()
+    from jobs import executor, registry
+    _, started = executor.submit(user_id, job_type, background_job, user_id, token_info, job_type,
+                                 on_submit=lambda: registry.start(user_id, job_type))
+    if not started:
+        print(f'{job_type} already in flight for {user_id}, attaching')
     return render_template('waiting.html', job_type=job_type)
 
 @app.route('/get_tracks')
@@ -257,20 +884,186 @@ def organize_tracks():
 def delete_playlists():
     return redirect(url_for('start_task', job_type='delete_playlists'))
 
-@app.route('/check_status')
-def check_status():
+def job_status_payload(job):
+    payload = {'status': 'pending' if job['state'] == 'running' else job['state'], 'job_type': job['job_type'],
+               'stage': job['stage'], 'progress': job['progress'],
+               'created_at': job['created_at'], 'updated_at': job['updated_at']}
+    if job['state'] == 'error':
+        payload['details'] = f"error: {job['error']}"
+    return payload
+
+@app.route('/job_events')
+def job_events():
+    # Server-Sent Events long poll of the user's job. Each request ends after JOB_EVENTS_TIMEOUT, so a waiting
+    # page only holds one of the gthread threads briefly; EventSource reconnects with the last id it saw
+    from jobs import registry
     user_id = session['user_id']
-    cache_file = f"./cache/{user_id}_status.json"
-    with open(cache_file, 'r') as f:
+    job_type = request.args.get('job_type')
+    last_version = int(request.headers.get('Last-Event-ID') or 0)
+
+    def stream():
+        version = last_version
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+        yield f'retry: {JOB_EVENTS_RETRY}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if registry.get(user_id, job_type) is None:
+                # Started by another worker without a shared store, or before a restart: only the status file knows
+                payload = stored_status(user_id, job_type)
+                if payload['status'] != 'pending':
+                    yield f"data: {json.dumps(payload)}\n\n"
+                    return
+                time.sleep(min(remaining, STATUS_FILE_POLL))
+                continue
+            job = registry.wait(user_id, job_type, version, timeout=remaining)
+            if job is None:
+                return
+            version = job['version']
+            yield f"id: {version}\ndata: {json.dumps(job_status_payload(job))}\n\n"
+            if job['state'] in ('completed', 'error'):
+                return
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stored_status(user_id, job_type):
+    # Status of a job the registry does not know, from the file every worker writes
+    status_file = f"./cache/{user_id}_status.json"
+    if not os.path.exists(status_file):
+        return {'status': 'pending'}
+    with open(status_file, 'r') as f:
         status = json.load(f)
     if status == 'completed':
-        job_type = request.args.get('job_type')
         print(f'checking status, job_type: {job_type}')
-        return jsonify({'status': 'completed', 'job_type': job_type})
+        return {'status': 'completed', 'job_type': job_type}
     elif 'error' in status:
-        return jsonify({'status': 'error', 'details': status})
+        return {'status': 'error', 'details': status}
     else:
-        return jsonify({'status': 'pending'})
+        return {'status': 'pending'}
+
+@app.route('/check_status')
+def check_status():
+    from jobs import registry
+    user_id = session['user_id']
+    job_type = request.args.get('job_type')
+    job = registry.get(user_id, job_type)
+    if job is not None:
+        return jsonify(job_status_payload(job))
+    return jsonify(stored_status(user_id, job_type))  # Jobs of other workers or from before a restart
+
+@app.route('/metrics')
+def metrics():
+    import spotify_client
+    import shared_cache
+    from jobs import executor
+    from cache_manager import cache_manager
+    return jsonify({'jobs': executor.stats(), 'spotify': spotify_client.stats(), 'cache': cache_manager.stats(),
+                    'shared_caches': shared_cache.stats()})
+
+def tracks_version(user_id):
+    # Version of the local liked songs cache, or of the projection another worker shared; None when neither exists
+    cache_file = f"./cache/{user_id}.json"
+    if os.path.exists(cache_file):
+        stat = os.stat(cache_file)
+        return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return shared_result(user_id, 'tracks_version')
+
+def load_track_view(user_id):
+    # Lean projection of the saved tracks, parsed from the raw payloads once per library version
+    version = tracks_version(user_id)
+    with track_views_lock:
+        view = track_views.get(user_id)
+        if view is not None and view['version'] == version:
+            track_views.move_to_end(user_id)
+            return view
+
+    lean_file = f"./cache/{user_id}_tracks.json"
+    tracks = None
+    if not os.path.exists(f"./cache/{user_id}.json"):  # Fetched on another worker
+        lean = shared_result(user_id, 'tracks') or {'version': version, 'tracks': []}
+        version, tracks = lean['version'], lean['tracks']
+    elif os.path.exists(lean_file):
+        with open(lean_file, 'r') as f:
+            lean = json.load(f)
+        if lean['version'] == version:
+            tracks = lean['tracks']
+    if tracks is None:
+        with open(f"./cache/{user_id}.json", 'r') as f:
+            tracks = [{k: track[k] for k in TRACK_FIELDS} for track in simplify_data(json.load(f))]
+        with open(lean_file, 'w') as f:
+            json.dump({'version': version, 'tracks': tracks}, f)
+
+    view = {'version': version, 'tracks': tracks, 'orders': {}}
+    with track_views_lock:
+        track_views[user_id] = view
+        while len(track_views) > TRACK_VIEW_USERS:
+            track_views.popitem(last=False)
+    return view
+
+def track_order(view, sort):
+    # Row indices for "field" or "-field", cached per view; ties keep library order
+    if sort not in view['orders']:
+        field = sort.lstrip('-')
+        tracks = view['tracks']
+        view['orders'][sort] = sorted(range(len(tracks)), key=lambda i: tracks[i][field], reverse=sort.startswith('-'))
+    return view['orders'][sort]
+
+@app.route('/api/tracks')
+def api_tracks():
+    # Cursor-paginated saved tracks: ?limit=&cursor=&q=&sort=[-]field&fields=a,b
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'error': 'not logged in'}), 401
+    version = tracks_version(user_id)
+    if version is None:
+        return jsonify({'error': 'no tracks found'}), 404
+
+    sort = request.args.get('sort', '')
+    fields = request.args.get('fields', ','.join(TRACK_FIELDS)).split(',')
+    if (sort and sort.lstrip('-') not in TRACK_FIELDS) or not set(fields) <= set(TRACK_FIELDS):
+        return jsonify({'error': f'fields and sort must be among {TRACK_FIELDS}'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', TRACK_PAGE_SIZE)), 1), TRACK_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    return conditional(file_etag(key=f'{version}?'.encode() + request.query_string),
+                       lambda: track_page(user_id, sort, fields, limit))
+
+def track_page(user_id, sort, fields, limit):
+    view = load_track_view(user_id)
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        version, _, position = cursor.partition(':')
+        if version != view['version'] or not position.isdigit():
+            return jsonify({'error': 'stale or invalid cursor, start again from the first page'}), 410
+        offset = int(position)
+
+    tracks = view['tracks']
+    order = track_order(view, sort) if sort else range(len(tracks))
+    query = request.args.get('q', '').strip().lower()
+    if query:
+        order = [i for i in order if query in tracks[i]['track_name'].lower()
+                 or query in tracks[i]['artist_names'].lower() or query in tracks[i]['album_name'].lower()]
+    page = order[offset:offset + limit]
+    next_offset = offset + len(page)
+    return jsonify({
+        'total': len(order),
+        'items': [{k: tracks[i][k] for k in fields} for i in page],
+        'next_cursor': f"{view['version']}:{next_offset}" if next_offset < len(order) else None,
+    })
+
+def render_analytics(user_id, an_text_file, stats_file):
+    timeline = load_timeline(user_id)
+    with open(an_text_file, 'r') as f:
+        ana_text = json.load(f)
+    stats = None
+    if os.path.exists(stats_file):
+        with open(stats_file, 'r') as f:
+            stats = json.load(f)
+    return render_template('analytics.html', timeline=timeline, text=ana_text, stats=stats)
 
 @app.route('/results')
 def results():
@@ -278,22 +1071,24 @@ def results():
     job_type = request.args.get('type')
     
     if job_type == 'get_tracks':
-        cache_file = f"./cache/{user_id}.json"
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                all_tracks = json.load(f)
-            return render_template('dashboard.html', tracks=all_tracks)
+        version = tracks_version(user_id)
+        if version is not None:
+            # Tracks are paged in from /api/tracks
+            return conditional(file_etag('./templates/dashboard.html', key=version.encode()), lambda: render_template('dashboard.html'))
         else:
             return render_template('message.html', text="No tracks found.")
     elif job_type == 'analyze_tracks':
         ana_file = f"./cache/{user_id}_AN.json"
         an_text_file = f"./cache/{user_id}_AN-Text.json"
         if os.path.exists(ana_file) and os.path.exists(an_text_file):
-            with open(ana_file, 'r') as f:
-                data = json.load(f)
-            with open(an_text_file, 'r') as f:
-                ana_text = json.load(f)
-            return render_template('analytics.html', data=data, text=ana_text)
+            stats_file = f"./cache/{user_id}_AN-Stats.json"
+            etag = file_etag(ana_file, an_text_file, stats_file, './templates/analytics.html')
+            return conditional(etag, lambda: render_analytics(user_id, an_text_file, stats_file))
+        analysis = shared_result(user_id, 'analysis')  # Analyzed on another worker
+        if analysis is not None:
+            etag = file_etag('./templates/analytics.html', key=analysis['version'].encode())
+            return conditional(etag, lambda: render_template('analytics.html', timeline=analysis['timeline'],
+                                                              text=analysis['text'], stats=analysis['stats']))
         else:
             return render_template('message.html', text="Analysis data not found")
     elif job_type == 'organize_tracks':
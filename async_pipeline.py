@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import httpx
+
+import spotify_client
+from spotify_client import SPOTIFY_MAX_RETRIES, async_limiter, bucket, endpoint_stats
+
+API_URL = 'https://api.spotify.com/v1'
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=spotify_client.SPOTIFY_MAX_CONCURRENCY * 2, max_keepalive_connections=20)
+
+class LoopThread:
+    # One event loop on a daemon thread runs the async jobs of every user in the process
+    def __init__(self):
+        self.loop = None
+        self.client = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='async-jobs', daemon=True).start()
+                self.client = self.run(self._make_client())
+        return self.loop
+
+    async def _make_client(self):
+        return httpx.AsyncClient(base_url=API_URL, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+
+    def submit(self, coro):
+        # Schedules the coroutine on the shared loop and returns a concurrent.futures.Future for it
+        return asyncio.run_coroutine_threadsafe(coro, self.loop or self.start())
+
+    def run(self, coro):
+        # Blocks the calling thread until the coroutine finishes on the shared loop
+        return self.submit(coro).result()
+
+runner = LoopThread()
+
+class AsyncSpotify:
+    # The handful of Web API calls the jobs use, named and shaped like their spotipy counterparts
+    def __init__(self, client, access_token):
+        self.client = client
+        self.headers = {'Authorization': f'Bearer {access_token}'}
+
+    async def request(self, endpoint, method, url, **kwargs):
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            wait = bucket.reserve()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = bucket.reserve()
+            await async_limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                response = await self.client.request(method, url, headers=self.headers, **kwargs)
+                throttled = response.status_code == 429
+                endpoint_stats.record(endpoint, time.monotonic() - started, throttled=throttled,
+                                      error=response.is_error and not throttled)
+                if throttled and attempt < SPOTIFY_MAX_RETRIES:
+                    retry_after = int(response.headers.get('Retry-After', 1))
+                    print(f'spotify {endpoint} throttled, retrying in {retry_after}s')
+                    bucket.pause(retry_after)
+                    continue
+                response.raise_for_status()
+                return response.json() if response.content else None
+            finally:
+                await async_limiter.release(throttled)
+
+    async def current_user_saved_tracks(self, limit=20, offset=0):
+        return await self.request('current_user_saved_tracks', 'GET', '/me/tracks', params={'limit': limit, 'offset': offset})
+
+    async def artists(self, artists):
+        return await self.request('artists', 'GET', '/artists', params={'ids': ','.join(artists)})
+
+    async def audio_features(self, tracks):
+        results = await self.request('audio_features', 'GET', '/audio-features', params={'ids': ','.join(tracks)})
+        return results['audio_features']
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        return await self.request('current_user_playlists', 'GET', '/me/playlists', params={'limit': limit, 'offset': offset})
+
+    async def next(self, result):
+        if result['next']:
+            return await self.request('next', 'GET', result['next'])
+        return None
+
+    async def user_playlist_create(self, user, name, public=True):
+        return await self.request('user_playlist_create', 'POST', f'/users/{user}/playlists',
+                                  json={'name': name, 'public': public})
+
+    async def playlist_add_items(self, playlist_id, items):
+        return await self.request('playlist_add_items', 'POST', f'/playlists/{playlist_id}/tracks',
+                                  json={'uris': [f'spotify:track:{item}' for item in items]})
+
+    async def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=('track',)):
+        params = {'limit': limit, 'offset': offset, 'additional_types': ','.join(additional_types)}
+        if fields:
+            params['fields'] = fields
+        return await self.request('playlist_items', 'GET', f'/playlists/{playlist_id}/tracks', params=params)
+
+    async def playlist_remove_all_occurrences_of_items(self, playlist_id, items):
+        return await self.request('playlist_remove_all_occurrences_of_items', 'DELETE', f'/playlists/{playlist_id}/tracks',
+                                  json={'tracks': [{'uri': f'spotify:track:{item}'} for item in items]})
+
+    async def current_user_unfollow_playlist(self, playlist_id):
+        return await self.request('current_user_unfollow_playlist', 'DELETE', f'/playlists/{playlist_id}/followers')
+
+# The stages below mirror the bg_* functions in app.py and share their pure helpers, so both paths
+# write identical cache files; only the waiting on Spotify is different. Anything that blocks, such as
+# file and cache I/O, registry updates (a Redis write with a shared store) or whole-library CPU work,
+# goes through asyncio.to_thread so one job never stalls the loop for everyone else.
+
+def job_progress(user_id, job_type):
+    # Awaitable counterpart of app.job_progress
+    import app as pipeline
+    progress = pipeline.job_progress(user_id, job_type)
+    return lambda **counters: asyncio.to_thread(progress, **counters)
+
+async def report_stage(user_id, job_type, stage):
+    import app as pipeline
+    await asyncio.to_thread(pipeline.report_stage, user_id, job_type, stage)
+
+async def fetch_all_saved_tracks(asp, limit=50, progress=None, archive=None):
+    import app as pipeline
+    first = await asp.current_user_saved_tracks(limit=limit, offset=0)
+    all_tracks = await asyncio.to_thread(pipeline.page_items, first, archive)
+    if progress:
+        await progress(pages_fetched=1)
+    if first['next'] is None:
+        return all_tracks
+
+    async def fetch_page(offset):
+        page = await asp.current_user_saved_tracks(limit=limit, offset=offset)
+        if progress:
+            await progress(pages_fetched=1)
+        return await asyncio.to_thread(pipeline.page_items, page, archive)
+
+    pages = await asyncio.gather(*(fetch_page(offset) for offset in range(limit, first['total'], limit)))
+    for items in pages:  # gather() keeps offset order
+        all_tracks.extend(items)
+    return all_tracks
+
+async def fetch_new_saved_tracks(asp, cached, limit=50, progress=None, archive=None):
+    import app as pipeline
+    known = {(entry['track']['id'], entry['added_at']) for entry in cached}
+    offset = 0
+    new_tracks = []
+    while True:
+        results = await asp.current_user_saved_tracks(limit=limit, offset=offset)
+        if progress:
+            await progress(pages_fetched=1)
+        entries = await asyncio.to_thread(pipeline.page_items, results)
+        fresh = pipeline.unseen_count(entries, known)
+        new_tracks.extend(entries[:fresh])
+        if archive and fresh:
+            await asyncio.to_thread(archive, results['items'][:fresh])
+        if fresh < len(entries) or results['next'] is None:
+            return new_tracks, results['total']
+        offset += limit
+
+async def lookup(cache, ids, fetch, chunk_size, label, progress=None):
+    unique_ids = list(dict.fromkeys(ids))
+    found = await asyncio.to_thread(cache.get_many, unique_ids)
+    hits = len(found)
+    misses = [key for key in unique_ids if key not in found]
+
+    async def fetch_batch(batch):
+        fetched = await fetch(batch)
+        await asyncio.to_thread(cache.set_many, fetched)
+        if progress:
+            await progress(chunks_enriched=1)
+        return fetched
+
+    batches = [misses[i:i+chunk_size] for i in range(0, len(misses), chunk_size)]
+    for fetched in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+        found.update(fetched)
+    await asyncio.to_thread(cache.save)
+    print(f'{label}: {hits} cached, {len(found) - hits} fetched in {len(batches)} calls')
+    return found
+
+async def enrich_data(data, asp, progress=None):
+    import app as pipeline
+    from shared_cache import artist_genres, track_features
+
+    async def fetch_genres(batch):
+        return pipeline.artist_genres_from(batch, (await asp.artists(batch))['artists'])
+
+    async def fetch_features(batch):
+        return pipeline.audio_features_from(batch, await asp.audio_features(batch))
+
+    genres, features = await asyncio.gather(
+        lookup(artist_genres, [track['artist_id'] for track in data], fetch_genres, 50, 'artist genres', progress),
+        lookup(track_features, [track['id'] for track in data], fetch_features, 100, 'audio features', progress))
+    await asyncio.to_thread(pipeline.apply_enrichment, data, genres, features)
+
+async def get_tracks(user_id, asp, job_type='get_tracks'):
+    import app as pipeline
+    await report_stage(user_id, job_type, 'fetching')
+    progress = job_progress(user_id, job_type)
+    cache_file = f"./cache/{user_id}.json"
+    if not os.path.exists(cache_file):
+        archive = pipeline.raw_archive(user_id, rewrite=True)
+        all_tracks = await fetch_all_saved_tracks(asp, progress=progress, archive=archive)
+        await asyncio.to_thread(pipeline.save_tracks, user_id, all_tracks)
+        await asyncio.to_thread(pipeline.save_sync_state, user_id, {'last_full_sync': time.time()})
+        return None
+
+    cached, shrunk = await asyncio.to_thread(lambda: pipeline.lean_tracks(load_json(cache_file)))
+    archive = pipeline.raw_archive(user_id)
+    new_tracks, total = await fetch_new_saved_tracks(asp, cached, progress=progress, archive=archive)
+    merged, removed = await asyncio.to_thread(pipeline.merge_new_tracks, cached, new_tracks)
+    state = await asyncio.to_thread(pipeline.load_sync_state, user_id)
+    if pipeline.needs_reconcile(total, merged, state):
+        archive = pipeline.raw_archive(user_id, rewrite=True)  # The full fetch replaces the archive
+        merged = await fetch_all_saved_tracks(asp, progress=progress, archive=archive)
+        new_tracks, removed = await asyncio.to_thread(pipeline.diff_tracks, cached, merged)
+        state['last_full_sync'] = time.time()
+
+    if new_tracks or removed or shrunk or len(merged) != len(cached):
+        await asyncio.to_thread(pipeline.save_tracks, user_id, merged)
+    await asyncio.to_thread(pipeline.save_sync_state, user_id, state)
+    if new_tracks or removed:
+        await update_analysis(user_id, asp, new_tracks, removed, job_type)
+    return {'added': new_tracks, 'removed': removed}
+
+async def update_analysis(user_id, asp, new_tracks, removed, job_type='get_tracks'):
+    import app as pipeline
+    ana_file = f"./cache/{user_id}_AN.json"
+    if not os.path.exists(ana_file):
+        return
+    data = await asyncio.to_thread(pipeline.load_analyzed, user_id)
+    added = await asyncio.to_thread(pipeline.simplify_data, new_tracks)
+    await report_stage(user_id, job_type, 'enriching')
+    await enrich_data(added, asp, job_progress(user_id, job_type))
+    await asyncio.to_thread(pipeline.classify_genres, added)
+    data = await asyncio.to_thread(pipeline.patch_analyzed, data, added, removed)
+    await asyncio.to_thread(pipeline.save_analyzed, user_id, data)
+    await asyncio.to_thread(pipeline.save_summary, user_id, data)
+
+async def analyze_tracks(user_id, asp, job_type='analyze_tracks'):
+    import app as pipeline
+    ana_file = f"./cache/{user_id}_AN.json"
+    data = None
+    if not os.path.exists(ana_file):
+        cache_file = f"./cache/{user_id}.json"
+        if not os.path.exists(cache_file):
+            await get_tracks(user_id, asp, job_type)
+        data = await asyncio.to_thread(lambda: pipeline.simplify_data(load_json(cache_file)))
+        await report_stage(user_id, job_type, 'enriching')
+        await enrich_data(data, asp, job_progress(user_id, job_type))
+        await asyncio.to_thread(pipeline.classify_genres, data)
+        await asyncio.to_thread(pipeline.save_analyzed, user_id, data)
+
+    await report_stage(user_id, job_type, 'analyzing')
+    if not os.path.exists(f"./cache/{user_id}_AN-Text.json") or not os.path.exists(f"./cache/{user_id}_AN-Stats.json"):
+        if data is None:
+            await asyncio.to_thread(pipeline.save_library_summary, user_id)
+        else:
+            await asyncio.to_thread(pipeline.save_summary, user_id, data)
+
+async def find_genrified_playlists(asp):
+    found = []
+    playlists = await asp.current_user_playlists(limit=50)
+    while playlists:
+        found.extend({'id': playlist['id'], 'name': playlist['name']} for playlist in playlists['items']
+                     if playlist['name'].startswith('Genrified_'))
+        playlists = await asp.next(playlists)
+    return found
+
+async def fetch_playlist_track_ids(asp, playlist_id):
+    track_ids = []
+    page = await asp.playlist_items(playlist_id, fields='items(track(id)),next', limit=100)
+    while page:
+        track_ids.extend(item['track']['id'] for item in page['items'] if item.get('track'))
+        page = await asp.next(page)
+    return track_ids
+
+async def sync_playlist(user_id, asp, name, wanted, playlist_id=None, job_type='organize_tracks', registry=None):
+    import app as pipeline
+    batch_size = 100  # Spotify's per-request item limit for playlist writes
+    if playlist_id is None:
+        playlist_id = (await asp.user_playlist_create(user=user_id, name=name, public=True))['id']
+        if registry is not None:
+            await asyncio.to_thread(pipeline.record_playlist, user_id, registry, name, playlist_id)
+        to_add, to_remove = list(dict.fromkeys(wanted)), []
+        await job_progress(user_id, job_type)(playlists_created=1)
+    else:
+        to_add, to_remove = pipeline.playlist_diff(wanted, await fetch_playlist_track_ids(asp, playlist_id))
+        if to_add or to_remove:
+            await job_progress(user_id, job_type)(playlists_updated=1)
+    for i in range(0, len(to_remove), batch_size):
+        await asp.playlist_remove_all_occurrences_of_items(playlist_id, to_remove[i:i + batch_size])
+    for i in range(0, len(to_add), batch_size):  # Sequential per playlist so track order is kept
+        await asp.playlist_add_items(playlist_id, to_add[i:i + batch_size])
+    return playlist_id
+
+async def organize_tracks(user_id, asp, job_type='organize_tracks'):
+    import app as pipeline
+    await analyze_tracks(user_id, asp, job_type)
+    buckets = pipeline.playlist_buckets(await asyncio.to_thread(pipeline.categorize_tracks, user_id, job_type))
+    await report_stage(user_id, job_type, 'syncing playlists')
+    existing, stale = pipeline.split_existing_playlists(await find_genrified_playlists(asp), buckets)
+    registry = await asyncio.to_thread(pipeline.start_playlist_registry, user_id, existing, stale)
+    playlist_ids = await asyncio.gather(*(sync_playlist(user_id, asp, name, wanted, existing.get(name), job_type, registry)
+                                          for name, wanted in buckets.items()))
+    await asyncio.gather(*(asp.current_user_unfollow_playlist(playlist_id) for playlist_id in stale))
+    await asyncio.to_thread(pipeline.save_playlist_registry, user_id, dict(zip(buckets, playlist_ids)))
+    if stale:
+        await job_progress(user_id, job_type)(playlists_deleted=len(stale))
+
+async def scan_genrified_playlists(asp):
+    import app as pipeline
+    found = []
+    playlists = await asp.current_user_playlists(limit=50)
+    while playlists:
+        found.extend(pipeline.genrified_ids(playlists))
+        playlists = await asp.next(playlists)
+    return found
+
+async def delete_playlists(user_id, asp, job_type='delete_playlists'):
+    import app as pipeline
+    await report_stage(user_id, job_type, 'deleting playlists')
+    registry = await asyncio.to_thread(pipeline.load_playlist_registry, user_id)
+    to_delete = list(registry.values()) if registry is not None else await scan_genrified_playlists(asp)
+
+    async def unfollow(playlist_id):
+        await asp.current_user_unfollow_playlist(playlist_id)
+        await job_progress(user_id, job_type)(playlists_deleted=1)
+
+    await asyncio.gather(*(unfollow(playlist_id) for playlist_id in to_delete))
+    await asyncio.to_thread(pipeline.save_playlist_registry, user_id, None)
+
+def load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+STAGES = {
+    'get_tracks': get_tracks,
+    'analyze_tracks': analyze_tracks,
+    'organize_tracks': organize_tracks,
+    'delete_playlists': delete_playlists,
+}
+
+async def run_job(user_id, asp, job_type):
+    import app as pipeline
+    try:
+        await STAGES[job_type](user_id, asp, job_type)
+    except Exception as e:
+        await asyncio.to_thread(pipeline.finish_job, user_id, job_type, e)
+        return
+    await asyncio.to_thread(pipeline.finish_job, user_id, job_type)
+
+def submit_job(user_id, access_token, job_type):
+    # Returns right away with a concurrent.futures.Future, the job itself runs on the shared loop
+    runner.start()
+    asp = AsyncSpotify(runner.client, access_token)
+    return runner.submit(run_job(user_id, asp, job_type))
@@ -0,0 +1,64 @@
+"""Per-request session overhead of each SESSION_BACKEND.
+
+    python bench_sessions.py [requests]
+
+Every backend runs in its own interpreter because the backend is chosen when app.py is imported.
+The redis backend is skipped unless REDIS_URL points at a reachable server.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+def run_backend():
+    # Child side: time REQUESTS logged-in requests against a route that only reads the user id
+    import app as genrify
+    genrify.app.add_url_rule('/_bench', '_bench', lambda: genrify.session.get('user_id', ''))
+    genrify.app.add_url_rule('/_bench_login', '_bench_login',
+                             lambda: genrify.session.__setitem__('user_id', 'bench') or 'ok')
+    client = genrify.app.test_client()
+    client.get('/_bench_login')
+    for _ in range(50):  # Warm up imports, the sweeper thread and the first session file
+        client.get('/_bench')
+
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get('/_bench')
+    per_request = (time.perf_counter() - started) / REQUESTS
+
+    started = time.perf_counter()
+    for _ in range(REQUESTS // 10):
+        client.get('/_bench_login')
+    per_login = (time.perf_counter() - started) / (REQUESTS // 10)
+    print(json.dumps({'request_us': round(per_request * 1e6, 1), 'login_us': round(per_login * 1e6, 1)}))
+
+def redis_reachable():
+    if not os.getenv('REDIS_URL'):
+        return False
+    try:
+        import redis
+        return redis.Redis.from_url(os.getenv('REDIS_URL'), socket_connect_timeout=1).ping()
+    except Exception:
+        return False
+
+def main():
+    backends = ['filesystem', 'cookie'] + (['redis'] if redis_reachable() else [])
+    print(f'{REQUESTS} requests per backend')
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as session_dir:
+            env = dict(os.environ, SESSION_BACKEND=backend, SESSION_FILE_DIR=session_dir, CACHE_SWEEP_INTERVAL='0',
+                       SECRET_KEY=os.getenv('SECRET_KEY', 'bench-only-secret'))
+            output = subprocess.run([sys.executable, __file__, str(REQUESTS), '--child'], env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:>10}: {result['request_us']:>8} us/request, {result['login_us']:>8} us/login")
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        run_backend()
+    else:
+        main()
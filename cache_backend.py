@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 'filesystem' keeps everything on this process' disk, 'redis' shares it between workers and dynos
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'filesystem')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_PREFIX = os.getenv('REDIS_PREFIX', 'genrify')
+REDIS_BATCH = 500  # Keys per MGET / pipelined SET round trip
+SQLITE_BATCH = 500  # Keys per SELECT, below SQLite's bound-parameter limit
+SHARED_CACHE_DIR = './cache/_shared/'
+
+class FilesystemStore:
+    # SQLite file per namespace with a TTL and LRU eviction past max_entries. Every worker on the machine reads
+    # and writes the same file key by key, so nothing is held in memory and an entry cached by one worker is
+    # visible to the others right away
+    shared = False
+
+    def __init__(self, name, ttl, max_entries):
+        self.path = os.path.join(SHARED_CACHE_DIR, f'{name}.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()  # sqlite3 connections may not cross threads
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')  # Readers don't wait for the writer
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS entries '
+                       '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)')
+            self._local.db = db
+        return db
+
+    def get_many(self, keys):
+        found = {}
+        now = time.time()
+        keys = list(keys)
+        db = self._db()
+        for i in range(0, len(keys), SQLITE_BATCH):
+            batch = keys[i:i + SQLITE_BATCH]
+            marks = ','.join('?' * len(batch))
+            rows = db.execute(f'SELECT key, value FROM entries WHERE key IN ({marks}) AND stored_at > ?',
+                              batch + [now - self.ttl]).fetchall()
+            if rows:
+                db.execute(f'UPDATE entries SET used_at = ? WHERE key IN ({",".join("?" * len(rows))})',
+                           [now] + [key for key, _ in rows])
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set_many(self, mapping):
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute('BEGIN')
+            db.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                           [(key, json.dumps(value), now, now) for key, value in mapping.items()])
+
+    def save(self):
+        # Entries are durable as soon as set_many returns, this only drops expired and least recently used ones
+        db = self._db()
+        with db:
+            db.execute('BEGIN')
+            db.execute('DELETE FROM entries WHERE stored_at <= ?', (time.time() - self.ttl,))
+            db.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                       (self.max_entries,))
+
+    def size(self):
+        return self._db().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+class RedisStore:
+    # One Redis key per entry under "{prefix}:{name}:", expiry does the TTL and maxmemory-policy the eviction
+    shared = True
+
+    def __init__(self, name, ttl, client=None):
+        self.prefix = f'{REDIS_PREFIX}:{name}:'
+        self.ttl = ttl
+        self.client = client
+
+    def _client(self):
+        if self.client is None:
+            self.client = redis_client()
+        return self.client
+
+    def get_many(self, keys):
+        # One MGET per REDIS_BATCH keys, all sent in a single pipelined round trip
+        keys = list(keys)
+        pipe = self._client().pipeline(transaction=False)
+        for i in range(0, len(keys), REDIS_BATCH):
+            pipe.mget([self.prefix + key for key in keys[i:i + REDIS_BATCH]])
+        values = [value for batch in pipe.execute() for value in batch] if keys else []
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping, ttl=None):
+        pipe = self._client().pipeline(transaction=False)
+        for n, (key, value) in enumerate(mapping.items(), 1):
+            pipe.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl)
+            if n % REDIS_BATCH == 0:
+                pipe.execute()
+        pipe.execute()
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def delete(self, key):
+        self._client().delete(self.prefix + key)
+
+    def save(self):
+        pass  # Every set_many is already durable in Redis
+
+    def size(self):
+        return None  # Counting would need a SCAN over the whole keyspace
+
+_redis = None
+_redis_lock = threading.Lock()
+
+def redis_client():
+    # One connection pool per process, redis is only imported when the backend is used
+    global _redis
+    with _redis_lock:
+        if _redis is None:
+            import redis
+            _redis = redis.Redis.from_url(REDIS_URL, health_check_interval=30)
+        return _redis
+
+def open_store(name, ttl, max_entries):
+    if CACHE_BACKEND == 'redis':
+        return RedisStore(name, ttl)
+    return FilesystemStore(name, ttl, max_entries)
+
+def shared_store(name, ttl):
+    # Store for state other workers must see, None when every worker only has its own disk
+    return RedisStore(name, ttl) if CACHE_BACKEND == 'redis' else None
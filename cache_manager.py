@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+CACHE_DIR = './cache/'
+CACHE_BUDGET_BYTES = int(os.getenv('CACHE_BUDGET_MB', 1024)) * 1024 * 1024  # Evict least recently used users above this
+CACHE_MAX_AGE = int(os.getenv('CACHE_MAX_AGE', 30 * 24 * 3600))  # Users idle this long are swept regardless of size
+CACHE_SWEEP_INTERVAL = int(os.getenv('CACHE_SWEEP_INTERVAL', 600))  # 0 disables the background sweeper
+STALE_TMP_AGE = 3600  # Leftovers of writes that never reached their os.replace
+SESSION_DIR = os.getenv('SESSION_FILE_DIR', './flask_session/')
+SESSION_MAX_AGE = int(os.getenv('SESSION_MAX_AGE', 31 * 24 * 3600))  # Filesystem sessions idle this long are removed
+ACCESS_FILE = os.path.join(CACHE_DIR, '_access.json')
+
+# Every file or directory a user owns in the cache, longest first so "_AN.json" wins over ".json"
+BUNDLE_SUFFIXES = sorted(['.json', '_AN.json', '_AN', '_AN-Text.json', '_AN-Stats.json', '_AN-Timeline.json',
+                          '_status.json', '_sync.json', '_playlists.json', '_tracks.json', '_raw.jsonl', '_token.json'],
+                         key=len, reverse=True)
+# Parts of a bundle the byte budget never evicts, only CACHE_MAX_AGE: dropping a token logs the user out
+KEPT_SUFFIXES = ('_token.json',)
+
+def bundle_owner(name):
+    for suffix in BUNDLE_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix) and not name.startswith('_'):
+            return name[:-len(suffix)]
+    return None
+
+def entry_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+class CacheManager:
+    # Keeps ./cache under a byte budget by evicting whole user bundles, least recently used first.
+    # Users with a queued or running job, in this worker or any other, are never touched
+    def __init__(self, budget=CACHE_BUDGET_BYTES, max_age=CACHE_MAX_AGE):
+        self.budget = budget
+        self.max_age = max_age
+        self.evicted = 0
+        self.last_sweep = None
+        self._access = {}  # user_id -> last request time, merged into ACCESS_FILE on every sweep
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def touch(self, user_id):
+        with self._lock:
+            self._access[user_id] = time.time()
+
+    def _merge_access(self):
+        # Other gunicorn workers track their own users, the file keeps the latest time seen by any of them
+        with self._lock:
+            access = dict(self._access)
+        if os.path.exists(ACCESS_FILE):
+            with open(ACCESS_FILE, 'r') as f:
+                for user_id, seen in json.load(f).items():
+                    access[user_id] = max(seen, access.get(user_id, 0))
+        return access
+
+    def _save_access(self, access):
+        tmp_path = f'{ACCESS_FILE}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(access, f)
+        os.replace(tmp_path, ACCESS_FILE)
+
+    def bundles(self):
+        # user_id -> {'paths': [...], 'kept': [...], 'bytes': n, 'mtime': newest file}, plus stale temp files to remove
+        bundles = {}
+        stale_tmp = []
+        now = time.time()
+        for name in os.listdir(CACHE_DIR):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                if name.endswith('.tmp'):
+                    if now - os.path.getmtime(path) > STALE_TMP_AGE:
+                        stale_tmp.append(path)
+                    continue
+                user_id = bundle_owner(name)
+                if user_id is None:
+                    continue
+                bundle = bundles.setdefault(user_id, {'paths': [], 'kept': [], 'bytes': 0, 'mtime': 0})
+                bundle['mtime'] = max(bundle['mtime'], os.path.getmtime(path))
+                if name.endswith(KEPT_SUFFIXES):
+                    bundle['kept'].append(path)
+                    continue
+                bundle['paths'].append(path)
+                bundle['bytes'] += entry_size(path)
+            except FileNotFoundError:  # Replaced or evicted while we looked
+                continue
+        return bundles, stale_tmp
+
+    def sweep(self):
+        from jobs import executor
+        if not os.path.isdir(CACHE_DIR):
+            return
+        access = self._merge_access()
+        bundles, stale_tmp = self.bundles()
+        for path in stale_tmp:
+            remove(path)
+
+        now = time.time()
+        total = sum(bundle['bytes'] for bundle in bundles.values())
+        # Users never seen by a request since tracking began fall back to their newest file
+        by_age = sorted(bundles, key=lambda user_id: access.get(user_id, bundles[user_id]['mtime']))
+        for user_id in by_age:
+            last_access = access.get(user_id, bundles[user_id]['mtime'])
+            expired = now - last_access > self.max_age
+            if not expired and (total <= self.budget or not bundles[user_id]['paths']):
+                continue
+            if self.job_elsewhere(user_id, now):
+                continue
+            paths = bundles[user_id]['paths'] + (bundles[user_id]['kept'] if expired else [])
+            if executor.run_if_idle(user_id, lambda: [remove(path) for path in paths]):
+                total -= bundles[user_id]['bytes']
+                if expired or not bundles[user_id]['kept']:
+                    access.pop(user_id, None)
+                    with self._lock:
+                        self._access.pop(user_id, None)
+                self.evicted += 1
+                print(f'cache: evicted {user_id} ({bundles[user_id]["bytes"]} bytes)')
+
+        self._save_access({user_id: seen for user_id, seen in access.items() if user_id in bundles})
+        self.last_sweep = {'at': now, 'bytes': total, 'users': len(bundles)}
+        self.sweep_sessions(now)
+
+    def job_elsewhere(self, user_id, now):
+        # The executor only knows this worker's jobs. Jobs started by other gunicorn workers show up in the shared
+        # registry, or without one in the user's _status.json; a 'pending' file older than JOB_STATUS_TTL
+        # belongs to a worker that died mid-job
+        from jobs import JOB_STATUS_TTL, registry
+        if registry.active(user_id):
+            return True
+        status_file = os.path.join(CACHE_DIR, f'{user_id}_status.json')
+        try:
+            if now - os.path.getmtime(status_file) > JOB_STATUS_TTL:
+                return False
+            with open(status_file, 'r') as f:
+                return json.load(f) == 'pending'
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def sweep_sessions(self, now):
+        # Filesystem sessions are rewritten on every request, so an old mtime means an abandoned session.
+        # This replaces Flask-Session's count threshold, which dropped live sessions along with dead ones
+        if not os.path.isdir(SESSION_DIR):
+            return
+        for name in os.listdir(SESSION_DIR):
+            path = os.path.join(SESSION_DIR, name)
+            try:
+                if now - os.path.getmtime(path) > SESSION_MAX_AGE:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def start_sweeper(self, interval=CACHE_SWEEP_INTERVAL):
+        with self._lock:
+            if self._sweeper is not None or interval <= 0:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, args=(interval,), name='cache-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _sweep_forever(self, interval):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:  # A bad sweep must not kill the thread
+                print(f'cache sweep failed: {e}')
+            time.sleep(interval)
+
+    def stats(self):
+        return {'budget_bytes': self.budget, 'evicted': self.evicted, 'last_sweep': self.last_sweep}
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+cache_manager = CacheManager()
@@ -1,3 +1,6 @@
+import re
+from functools import lru_cache
+
 # Generalize Niche Genres
 subgenre_to_general_genre = {
     'a cappella': 'Others',
@@ -602,7 +605,7 @@ subgenre_to_general_genre = {
     'garage rock': 'Rock',
     'gauze pop': 'Pop',
     'gbvfi': 'Indie',
-    'geek folk': 'Folk',
+    'geek folk': 'Country/Folk',
     'geek rock': 'Rock',
     'german ccm': 'Others',
     'german hip hop': 'Hip-Hop',
@@ -1385,30 +1388,44 @@ subgenre_to_general_genre = {
     'zydeco': 'Others',
 }
 
+# General genres in organize priority order, also the column order of analysis.genre_matrix
+general_genres = ["Soundtracks", "Classical", "Experimental", "Jazz", "Country/Folk", "Funk", "Rock", "RnB/Soul", "Indie", "Hip-Hop", "Electronic", "Pop", "Others"]
+general_index = {genre: i for i, genre in enumerate(general_genres)}
+
+def genre_column(genre):
+    # Column of a general genre; labels outside general_genres, like 'Folk' in analyses written before the
+    # map was fixed, count as Others instead of failing the whole library
+    return general_index.get(genre, general_index['Others'])
+
+# Substring fallbacks for unmapped or 'Others' genres, checked in priority order
+fallback_keywords = [
+    ('Jazz', ['jazz', 'fusion', 'blues']),
+    ('Funk', ['funk', 'boogie']),
+    ('RnB/Soul', ['soul', 'r&b', 'disco']),
+    ('Soundtracks', ['movie', 'game', 'soundtrack']),
+    ('Hip-Hop', ['rap', 'hip hop', 'boom bap']),
+    ('Country/Folk', ['folk', 'country']),
+    ('Rock', ['grunge', 'rock', 'punk', 'new wave', 'metal']),
+    ('Indie', ['indie', 'alternative']),
+    ('Experimental', ['avant', 'experimental']),
+    ('Electronic', ['house', 'trance', 'bass', 'synth', 'techno', 'electro']),
+    ('Pop', ['pop']),
+]
+
+keyword_priority = {keyword: rank for rank, (_, keywords) in enumerate(fallback_keywords) for keyword in keywords}
+
+# One pass finds every keyword occurrence: the lookahead matches at each position without consuming,
+# and no keyword is a prefix of another so at most one alternative can match per position
+keyword_pattern = re.compile('(?=(' + '|'.join(re.escape(k) for k in keyword_priority) + '))')
+
+@lru_cache(maxsize=8192)
 def convert(g):
     # Jazz, Funk, RnB/Soul, Classical, Soundtracks, Hip-Hop, Country/Folk, Rock, Indie, Experimental, Electronic, Pop, and Others.
-    if (g not in subgenre_to_general_genre) or (subgenre_to_general_genre[g] == 'Others'):
-        if 'jazz' in g or 'fusion' in g or 'blues' in g:
-            return 'Jazz'
-        if 'funk' in g or 'boogie' in g:
-            return 'Funk'
-        if 'soul' in g or 'r&b' in g or 'disco' in g:
-            return 'RnB/Soul'
-        if 'movie' in g or 'game' in g or 'soundtrack' in g:
-            return 'Soundtracks'
-        if 'rap' in g or 'hip hop' in g or 'boom bap' in g:
-            return 'Hip-Hop'
-        if 'folk' in g or 'country' in g:
-            return 'Country/Folk'
-        if 'grunge' in g or 'rock' in g or 'punk' in g or 'new wave' in g or 'metal' in g:
-            return 'Rock'
-        if 'indie' in g or 'alternative' in g:
-            return 'Indie'
-        if 'avant' in g or 'experimental' in g:
-            return 'Experimental'
-        if 'house' in g or 'trance' in g or 'bass' in g or 'synth' in g or 'techno' in g or 'electro' in g:
-            return 'Electronic'
-        if 'pop' in g:
-            return 'Pop'
-        return 'Others'
-    return subgenre_to_general_genre[g]
\ No newline at end of file
+    general = subgenre_to_general_genre.get(g, 'Others')
+    if general != 'Others':
+        return general
+    ranks = [keyword_priority[keyword] for keyword in keyword_pattern.findall(g)]
+    return fallback_keywords[min(ranks)][0] if ranks else 'Others'
+
+def convert_many(genres):
+    return [convert(g) for g in genres]
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache_backend import shared_store
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_STATUS_TTL = int(os.getenv('JOB_STATUS_TTL', 24 * 3600))  # Seconds a job stays visible to other workers
+JOB_POLL_INTERVAL = 0.5  # Seconds between shared-store checks while waiting on another worker's job
+JOB_PRUNE_INTERVAL = 60  # Seconds between sweeps of finished jobs out of a registry
+JOB_TYPES = ('get_tracks', 'analyze_tracks', 'organize_tracks', 'delete_playlists')
+
+class JobExecutor:
+    # Bounded worker pool for background jobs, a (user, job_type) already queued or running is reused.
+    # Jobs of one user run one after another, so two job types never write the same user's cache files at once;
+    # a job waiting for its user's previous job stays out of the pool and does not hold a worker
+    def __init__(self, max_workers=JOB_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._in_flight = {}  # (user_id, job_type) -> Future
+        self._user_jobs = {}  # user_id -> deque of (future, fn, args), the head is queued in the pool or running
+        self._running = 0
+        self._offloaded = 0  # Jobs whose work runs on the event loop, in flight without a worker
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, job_type, fn, *args, on_submit=None):
+        # Returns (future, started), started is False when the request attached to an in-flight job.
+        # on_submit runs before a new job can start, so its bookkeeping is never overtaken by the job
+        key = (user_id, job_type)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None and not future.done():
+                return future, False
+            if on_submit:
+                on_submit()
+            future = Future()
+            self._in_flight[key] = future
+            jobs = self._user_jobs.setdefault(user_id, deque())
+            jobs.append((future, fn, args))
+            if len(jobs) == 1:
+                self._pool.submit(self._run, user_id)
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, True
+
+    def _run(self, user_id):
+        # A job that returns a Future (an async job on the event loop) stays in flight until that Future is
+        # done, but gives its worker back right away
+        with self._lock:
+            future, fn, args = self._user_jobs[user_id][0]
+            self._running += 1
+        offloaded = False
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    if isinstance(result, Future):
+                        offloaded = True
+                        with self._lock:
+                            self._offloaded += 1
+                        result.add_done_callback(lambda done: self._settle(user_id, future, done))
+                    else:
+                        future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+            if not offloaded:
+                self._next(user_id)
+
+    def _settle(self, user_id, future, done):
+        with self._lock:
+            self._offloaded -= 1
+        try:
+            future.set_result(done.result())
+        except BaseException as e:  # Includes a cancelled coroutine
+            future.set_exception(e)
+        self._next(user_id)
+
+    def _next(self, user_id):
+        with self._lock:
+            jobs = self._user_jobs[user_id]
+            jobs.popleft()
+            if jobs:
+                self._pool.submit(self._run, user_id)  # The user's next job goes to the back of the queue
+            else:
+                del self._user_jobs[user_id]
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def run_if_idle(self, user_id, fn):
+        # Runs fn() unless the user has a job queued or running, no job for them can start meanwhile
+        with self._lock:
+            if any(key[0] == user_id for key in self._in_flight):
+                return False
+            fn()
+            return True
+
+    def active_users(self):
+        with self._lock:
+            return {user_id for user_id, _ in self._in_flight}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'busy': self._running,
+                'utilization': self._running / self.max_workers,
+                'queue_depth': len(self._in_flight) - self._running - self._offloaded,
+                'offloaded': self._offloaded,
+                'in_flight': len(self._in_flight),
+            }
+
+executor = JobExecutor()
+
+class JobRegistry:
+    # Latest job per (user, job_type) with its state, stage, progress counters and timestamps; waiters are woken
+    # on change. With a shared store every change is mirrored there, so a worker that did not run the job can
+    # still report it
+    def __init__(self, store=None, ttl=JOB_STATUS_TTL):
+        self._jobs = {}  # (user_id, job_type) -> job
+        self._changed = threading.Condition()
+        self.store = store
+        self.ttl = ttl
+        self._pruned_at = 0
+
+    def _prune(self, now):
+        # Finished jobs are forgotten after ttl, like their shared-store copies; callers hold self._changed
+        if now - self._pruned_at < JOB_PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        for key in [key for key, job in self._jobs.items()
+                    if job['state'] in ('completed', 'error') and now - job['updated_at'] > self.ttl]:
+            del self._jobs[key]
+
+    def _publish(self, key):
+        if self.store is not None:
+            self.store.set(f'{key[0]}:{key[1]}', self._jobs[key])
+
+    def _remote(self, key):
+        return self.store.get(f'{key[0]}:{key[1]}') if self.store is not None else None
+
+    def start(self, user_id, job_type):
+        key = (user_id, job_type)
+        now = time.time()
+        previous = self.get(user_id, job_type) or {}  # Versions keep growing even when the last job ran elsewhere
+        with self._changed:
+            self._prune(now)
+            version = max(previous.get('version', 0), self._jobs.get(key, {}).get('version', 0)) + 1
+            self._jobs[key] = {'job_type': job_type, 'state': 'pending', 'stage': None, 'progress': {},
+                               'error': None, 'created_at': now, 'updated_at': now, 'version': version}
+            self._publish(key)
+            self._changed.notify_all()
+
+    def update(self, user_id, job_type, state=None, stage=None, error=None, **progress):
+        # Progress keyword arguments are counters and are added to the current value
+        key = (user_id, job_type)
+        with self._changed:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            if state is not None:
+                job['state'] = state
+            if stage is not None:
+                job['stage'] = stage
+            if error is not None:
+                job['error'] = error
+            for name, n in progress.items():
+                job['progress'][name] = job['progress'].get(name, 0) + n
+            job['updated_at'] = time.time()
+            job['version'] += 1
+            self._publish(key)
+            self._changed.notify_all()
+
+    def get(self, user_id, job_type):
+        key = (user_id, job_type)
+        with self._changed:
+            job = self._jobs.get(key)
+            job = None if job is None else dict(job, progress=dict(job['progress']))
+        remote = self._remote(key)
+        if remote is not None and (job is None or remote['version'] > job['version']):
+            return remote
+        return job
+
+    def active(self, user_id):
+        # True while any job of the user is pending or running here or, with a shared store, on another worker
+        return any((self.get(user_id, job_type) or {}).get('state') in ('pending', 'running') for job_type in JOB_TYPES)
+
+    def wait(self, user_id, job_type, since_version, timeout):
+        # Blocks until the job is newer than since_version, returns None on timeout.
+        # Local changes wake the waiter directly, jobs on other workers are polled from the shared store
+        key = (user_id, job_type)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                changed = self._changed.wait_for(
+                    lambda: self._jobs.get(key, {}).get('version', 0) > since_version,
+                    remaining if self.store is None else min(remaining, JOB_POLL_INTERVAL))
+            if changed or self.store is not None:
+                job = self.get(user_id, job_type)
+                if job is not None and job['version'] > since_version:
+                    return job
+
+registry = JobRegistry(shared_store('jobs', JOB_STATUS_TTL))
@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from shared_cache import lastfm_bios, lastfm_tags
+
+API_URL = 'http://ws.audioscrobbler.com/2.0/'
+API_KEY = os.getenv('LASTFM_API_KEY', '9ba91375b3fa52ccffec116c0656f908')
+TIMEOUT = (3.05, 10)  # (connect, read) seconds
+LASTFM_CONCURRENCY = int(os.getenv('LASTFM_CONCURRENCY', 5))
+
+def make_session():
+    # Pooled keep-alive connections, transient failures and 429s are retried with backoff
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=LASTFM_CONCURRENCY)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+session = make_session()
+
+def call(method, artist_name):
+    # Returns the decoded JSON, or None when Last.fm could not be reached
+    params = {'method': method, 'artist': artist_name, 'api_key': API_KEY, 'format': 'json'}
+    try:
+        response = session.get(API_URL, params=params, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        print(f'last.fm {method} failed for {artist_name}: {e}')
+        return None
+    if response.status_code == 200:
+        return response.json()
+    return {}
+
+def fetch_tags(artist_name):
+    data = call('artist.gettoptags', artist_name)
+    if data is None:
+        return None, False
+    if 'toptags' in data and 'tag' in data['toptags']:
+        return [tag['name'] for tag in data['toptags']['tag']][:10], True  # Get Top 10 Tags
+    return None, True
+
+def fetch_bio(artist_name):
+    data = call('artist.getinfo', artist_name)
+    if data is None:
+        return None, False
+    if 'artist' in data and 'bio' in data['artist']:
+        return data['artist']['bio']['summary'], True
+    return None, True
+
+def lookup_many(cache, fetch, artist_names):
+    # Cache hits are free, misses are fetched concurrently and only definitive answers are cached
+    names = list(dict.fromkeys(artist_names))
+    found = cache.get_many(names)
+    misses = [name for name in names if name not in found]
+    if misses:
+        with ThreadPoolExecutor(max_workers=LASTFM_CONCURRENCY) as pool:
+            results = list(pool.map(fetch, misses))
+        cache.set_many({name: value for name, (value, ok) in zip(misses, results) if ok})
+        cache.save()
+        found.update({name: value for name, (value, _) in zip(misses, results)})
+    return found
+
+def get_tags_many(artist_names):
+    return lookup_many(lastfm_tags, fetch_tags, artist_names)
+
+def get_tags(artist_name):
+    return get_tags_many([artist_name])[artist_name]
+
+def get_bio(artist_name):
+    return lookup_many(lastfm_bios, fetch_bio, [artist_name])[artist_name]
@@ -0,0 +1,194 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from genre_map import general_genres, genre_column
+
+# Column layout of an analyzed library, every column is its own file so a stage only maps what it reads
+STRING_COLUMNS = ['id', 'track_name', 'album_name', 'artist_names', 'artist_id', 'added_at', 'album_release_date',
+                  'release_date_precision']
+NUMERIC_COLUMNS = {
+    'track_popularity': 'int16',
+    'release_year': 'int16',
+    'acousticness': 'float32',
+    'danceability': 'float32',
+    'energy': 'float32',
+    'instrumentalness': 'float32',
+    'liveness': 'float32',
+    'loudness': 'float32',
+    'speechiness': 'float32',
+    'tempo': 'float32',
+    'valence': 'float32',
+    'key': 'int8',
+    'mode': 'int8',
+    'time_signature': 'int8',
+}
+def genres_to_mask(genres):
+    mask = 0
+    for genre in genres:
+        mask |= 1 << genre_column(genre)
+    return mask
+
+def mask_to_matrix(masks):
+    # uint16 bitmask column -> tracks x general genres boolean matrix, same layout as analysis.genre_matrix
+    bits = np.arange(len(general_genres), dtype=np.uint16)
+    return ((np.asarray(masks, dtype=np.uint16)[:, None] >> bits) & 1).astype(bool)
+
+class LibraryWriter:
+    # Appends records column by column into a temp directory, close() swaps it into place
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'  # One per writer thread
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.count = 0
+        self._files = {}
+        self._offsets = {name: 0 for name in STRING_COLUMNS}
+        for name in STRING_COLUMNS:
+            self._files[name] = open(os.path.join(self.tmp_path, f'{name}.bin'), 'wb')
+            self._files[f'{name}.offsets'] = open(os.path.join(self.tmp_path, f'{name}.offsets'), 'wb')
+            self._files[f'{name}.offsets'].write(np.zeros(1, dtype=np.int64).tobytes())
+        for name in list(NUMERIC_COLUMNS) + ['genres']:
+            self._files[name] = open(os.path.join(self.tmp_path, f'{name}.bin'), 'wb')
+
+    def append(self, records):
+        if not records:
+            return
+        for name in STRING_COLUMNS:
+            encoded = [str(record[name]).encode('utf-8') for record in records]
+            ends = self._offsets[name] + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+            self._files[name].write(b''.join(encoded))
+            self._files[f'{name}.offsets'].write(ends.tobytes())
+            self._offsets[name] = int(ends[-1])
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._files[name].write(np.array([record[name] for record in records], dtype=dtype).tobytes())
+        masks = np.array([genres_to_mask(record['genres']) for record in records], dtype=np.uint16)
+        self._files['genres'].write(masks.tobytes())
+        self.count += len(records)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'count': self.count, 'numeric': NUMERIC_COLUMNS, 'strings': STRING_COLUMNS}, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+
+class JsonArrayWriter:
+    # Streams a JSON list to a temp file batch by batch, close() swaps it into place; output matches json.dump
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'  # One per writer thread
+        self._file = open(self.tmp_path, 'w')
+        self._file.write('[')
+        self._empty = True
+
+    def append(self, items):
+        for item in items:
+            self._file.write(json.dumps(item) if self._empty else ', ' + json.dumps(item))
+            self._empty = False
+
+    def close(self):
+        self._file.write(']')
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+def iter_json_array(path, block_size=1 << 20):
+    # Yields the items of a JSON list file one by one, holding a block of text and the current item in memory
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = f.read(block_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{path} does not hold a JSON list')
+        pos = 1
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+                    raise ValueError('item may continue in the next block')  # e.g. a number cut in half
+            except ValueError:
+                if eof:
+                    raise
+                block = f.read(block_size)
+                eof = not block
+                buffer, pos = buffer[pos:] + block, 0
+                continue
+            yield item
+            pos = end
+
+class StringColumn:
+    # Lazily decoded view over a utf-8 blob and its int64 end offsets
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def tolist(self):
+        data = bytes(self.blob)
+        offsets = self.offsets.tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+class Library:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.count = self.meta['count']
+
+    def _map(self, filename, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)  # np.memmap refuses empty files
+        return np.memmap(os.path.join(self.path, filename), dtype=dtype, mode='r', shape=(length,))
+
+    def column(self, name):
+        if name in self.meta['strings']:
+            offsets = self._map(f'{name}.offsets', np.int64, self.count + 1)
+            return StringColumn(self._map(f'{name}.bin', np.uint8, int(offsets[-1])), offsets)
+        if name == 'genres':
+            return self._map('genres.bin', np.uint16, self.count)
+        return self._map(f'{name}.bin', self.meta['numeric'][name], self.count)
+
+    def columns(self, names):
+        return {name: self.column(name) for name in names}
+
+    def values(self, name):
+        # Numeric column as float64 or int64 holding the same values as the JSON records, float32 goes through
+        # its shortest repr so 0.123 stays 0.123
+        values = self.column(name)
+        if self.meta['numeric'][name].startswith('float'):
+            return np.array([float(str(v)) for v in values], dtype=np.float64)
+        return np.asarray(values, dtype=np.int64)
+
+    def to_records(self):
+        # JSON-compatible export, float32 values go through their shortest repr so 0.123 stays 0.123
+        columns = {}
+        for name in self.meta['strings']:
+            columns[name] = self.column(name).tolist()
+        for name, dtype in self.meta['numeric'].items():
+            values = self.column(name)
+            columns[name] = [float(str(v)) for v in values] if dtype.startswith('float') else values.tolist()
+        matrix = mask_to_matrix(self.column('genres'))
+        columns['genres'] = [[general_genres[i] for i in np.flatnonzero(row)] for row in matrix]
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+def write_library(path, records):
+    writer = LibraryWriter(path)
+    writer.append(records)
+    writer.close()
+
+def open_library(path):
+    return Library(path)
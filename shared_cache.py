@@ -0,0 +1,45 @@
+import os
+import threading
+
+from cache_backend import open_store
+
+class SharedCache:
+    # Persistent key -> value cache shared by every user, stored on the configured cache backend
+    def __init__(self, name, ttl, max_entries):
+        self.name = name
+        self.store = open_store(name, ttl, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        # Returns {key: value} for the fresh hits, every other key counts as a miss
+        keys = list(keys)
+        found = self.store.get_many(keys)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, mapping):
+        self.store.set_many(mapping)
+
+    def save(self):
+        self.store.save()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': self.store.size()}
+
+artist_genres = SharedCache('artist_genres', ttl=int(os.getenv('ARTIST_CACHE_TTL', 30 * 24 * 3600)),
+                            max_entries=int(os.getenv('ARTIST_CACHE_SIZE', 200000)))
+track_features = SharedCache('track_features', ttl=int(os.getenv('FEATURE_CACHE_TTL', 365 * 24 * 3600)),
+                             max_entries=int(os.getenv('FEATURE_CACHE_SIZE', 500000)))
+lastfm_tags = SharedCache('lastfm_tags', ttl=int(os.getenv('LASTFM_CACHE_TTL', 14 * 24 * 3600)),
+                          max_entries=int(os.getenv('LASTFM_CACHE_SIZE', 50000)))
+lastfm_bios = SharedCache('lastfm_bios', ttl=int(os.getenv('LASTFM_CACHE_TTL', 14 * 24 * 3600)),
+                          max_entries=int(os.getenv('LASTFM_CACHE_SIZE', 50000)))
+
+def stats():
+    # Hit/miss counts of every shared cache, i.e. the Spotify and Last.fm calls they saved
+    return {cache.name: cache.stats() for cache in (artist_genres, track_features, lastfm_tags, lastfm_bios)}
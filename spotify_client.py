@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.exceptions import SpotifyException
+from urllib3.util.retry import Retry
+
+SPOTIFY_RATE = float(os.getenv('SPOTIFY_RATE', 10))  # Requests per second across every job in the process
+SPOTIFY_BURST = int(os.getenv('SPOTIFY_BURST', 20))
+SPOTIFY_MIN_CONCURRENCY = 1
+SPOTIFY_MAX_CONCURRENCY = int(os.getenv('SPOTIFY_MAX_CONCURRENCY', 16))
+SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', 5))
+THROUGHPUT_WINDOW = 60  # Seconds of history behind the per-endpoint calls/sec figure
+
+class TokenBucket:
+    # Paces calls to `rate` per second with bursts up to `burst`, pause() holds everyone until a Retry-After passes
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token if one is free and returns 0, otherwise returns how long to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = self.paused_until - now
+            if wait > 0:
+                return wait
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class AdaptiveLimiter:
+    # AIMD in-flight limit: +1 per window of successes, halved on every 429
+    def __init__(self, initial, minimum, maximum):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._changed = threading.Condition()
+
+    def acquire(self):
+        with self._changed:
+            self._changed.wait_for(self.has_room)
+            self.in_flight += 1
+
+    def release(self, throttled):
+        with self._changed:
+            self.adjust(throttled)
+            self._changed.notify_all()
+
+    def has_room(self):
+        return self.in_flight < int(self.limit)
+
+    def adjust(self, throttled):
+        self.in_flight -= 1
+        if throttled:
+            self.limit = max(self.minimum, self.limit / 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+class AsyncAdaptiveLimiter(AdaptiveLimiter):
+    # Same AIMD rule for coroutines on one event loop
+    def __init__(self, initial, minimum, maximum):
+        super().__init__(initial, minimum, maximum)
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(self.has_room)
+            self.in_flight += 1
+
+    async def release(self, throttled):
+        async with self._changed:
+            self.adjust(throttled)
+            self._changed.notify_all()
+
+class EndpointStats:
+    def __init__(self):
+        self._calls = defaultdict(lambda: {'calls': 0, 'throttled': 0, 'errors': 0, 'latency': 0.0, 'recent': deque()})
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, throttled=False, error=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._calls[endpoint]
+            entry['calls'] += 1
+            entry['throttled'] += throttled
+            entry['errors'] += error
+            entry['latency'] += latency
+            entry['recent'].append(now)
+            while entry['recent'][0] < now - THROUGHPUT_WINDOW:
+                entry['recent'].popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return {endpoint: {
+                'calls': entry['calls'],
+                'throttled': entry['throttled'],
+                'errors': entry['errors'],
+                'avg_latency': round(entry['latency'] / entry['calls'], 4),
+                'calls_per_sec': round(sum(1 for t in entry['recent'] if t >= now - THROUGHPUT_WINDOW) / THROUGHPUT_WINDOW, 3),
+            } for endpoint, entry in self._calls.items()}
+
+bucket = TokenBucket(SPOTIFY_RATE, SPOTIFY_BURST)
+limiter = AdaptiveLimiter(4, SPOTIFY_MIN_CONCURRENCY, SPOTIFY_MAX_CONCURRENCY)
+async_limiter = AsyncAdaptiveLimiter(4, SPOTIFY_MIN_CONCURRENCY, SPOTIFY_MAX_CONCURRENCY)  # Used by async_pipeline
+endpoint_stats = EndpointStats()
+
+class RateLimitedSpotify:
+    # Wraps a spotipy client so every method call goes through the shared bucket and AIMD limiter
+    def __init__(self, sp):
+        self.sp = sp
+
+    def __getattr__(self, name):
+        attr = getattr(self.sp, name)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self.call(name, attr, *args, **kwargs)
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            bucket.acquire()
+            limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                result = fn(*args, **kwargs)
+                endpoint_stats.record(endpoint, time.monotonic() - started)
+                return result
+            except SpotifyException as e:
+                throttled = e.http_status == 429
+                endpoint_stats.record(endpoint, time.monotonic() - started, throttled=throttled, error=not throttled)
+                if not throttled or attempt == SPOTIFY_MAX_RETRIES:
+                    raise
+                retry_after = int((e.headers or {}).get('Retry-After', 1))
+                print(f'spotify {endpoint} throttled, retrying in {retry_after}s')
+                bucket.pause(retry_after)
+            finally:
+                limiter.release(throttled)
+
+def spotify_session():
+    # Same retries as spotipy's own session, except that urllib3 must not honor Retry-After itself: it would
+    # sleep through every 429 inside the request, and RateLimitedSpotify would never see the throttling
+    retry = Retry(total=3, connect=None, read=False, allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                  status=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                  respect_retry_after_header=False)
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(max_retries=retry))
+    session.mount('https://', HTTPAdapter(max_retries=retry))
+    return session
+
+def make_spotify(access_token):
+    return RateLimitedSpotify(spotipy.Spotify(auth=access_token, requests_session=spotify_session()))
+
+def stats():
+    return {'concurrency_limit': round(limiter.limit, 2), 'in_flight': limiter.in_flight,
+            'async_concurrency_limit': round(async_limiter.limit, 2), 'async_in_flight': async_limiter.in_flight,
+            'endpoints': endpoint_stats.snapshot()}
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+import cache_backend
+from cache_backend import REDIS_BATCH, FilesystemStore, RedisStore
+from jobs import JobRegistry
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+@pytest.mark.parametrize('n', [1, REDIS_BATCH - 1, REDIS_BATCH, REDIS_BATCH + 1, 2 * REDIS_BATCH + 201])
+def test_redis_batches_round_trip(client, n):
+    store = RedisStore('artists', ttl=60, client=client)
+    mapping = {f'id{i}': {'genres': [f'g{i}'], 'n': i} for i in range(n)}
+    store.set_many(mapping)
+    assert client.dbsize() == n
+
+    # Every other key is missing, so hits and misses straddle each batch boundary
+    keys = [key for i in range(n) for key in (f'id{i}', f'missing{i}')]
+    assert store.get_many(keys) == mapping
+    assert store.get_many([]) == {}
+
+def test_redis_keys_are_namespaced(client):
+    RedisStore('artists', ttl=60, client=client).set('x', 1)
+    RedisStore('features', ttl=60, client=client).set('x', 2)
+    assert RedisStore('artists', ttl=60, client=client).get('x') == 1
+    assert client.get(f'{cache_backend.REDIS_PREFIX}:features:x') == b'2'
+
+def test_redis_ttl(client):
+    store = RedisStore('artists', ttl=60, client=client)
+    store.set_many({f'id{i}': i for i in range(REDIS_BATCH + 1)})
+    store.set('short', 1, ttl=5)
+    assert 55 <= client.ttl(f'{store.prefix}id0') <= 60
+    assert 55 <= client.ttl(f'{store.prefix}id{REDIS_BATCH}') <= 60
+    assert 0 < client.ttl(f'{store.prefix}short') <= 5
+
+    store.delete('short')
+    assert store.get('short') is None
+
+def test_registries_share_jobs_across_workers(client):
+    # Two registries on one store stand in for two gunicorn workers
+    store = RedisStore('jobs', ttl=60, client=client)
+    web, worker = JobRegistry(store), JobRegistry(store)
+
+    worker.start('u', 'get_tracks')
+    worker.update('u', 'get_tracks', state='running', pages_fetched=2)
+    job = web.get('u', 'get_tracks')
+    assert (job['state'], job['progress']) == ('running', {'pages_fetched': 2})
+    assert web.get('u', 'analyze_tracks') is None
+    assert web.active('u') and not web.active('someone else')
+
+    # A job started on the web side continues the version numbers of the worker's job
+    web.start('u', 'get_tracks')
+    assert web.get('u', 'get_tracks')['version'] == job['version'] + 1
+
+def test_wait_sees_changes_from_another_worker(client):
+    store = RedisStore('jobs', ttl=60, client=client)
+    web, worker = JobRegistry(store), JobRegistry(store)
+    worker.start('u', 'analyze_tracks')
+    version = web.get('u', 'analyze_tracks')['version']
+
+    assert web.wait('u', 'analyze_tracks', version, timeout=0.2) is None
+    threading.Timer(0.2, lambda: worker.update('u', 'analyze_tracks', state='completed')).start()
+    job = web.wait('u', 'analyze_tracks', version, timeout=5)
+    assert job['state'] == 'completed' and job['version'] > version
+
+def test_filesystem_entries_are_shared_between_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_backend, 'SHARED_CACHE_DIR', str(tmp_path))
+    first, second = FilesystemStore('artists', 60, 100), FilesystemStore('artists', 60, 100)
+    assert first.get_many(['a']) == {}
+    second.set_many({'a': ['rock'], 'b': []})
+    assert first.get_many(['a', 'b', 'c']) == {'a': ['rock'], 'b': []}  # No save or reload needed
+    assert first.size() == 2
+
+def test_filesystem_batches_ttl_and_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_backend, 'SHARED_CACHE_DIR', str(tmp_path))
+    store = FilesystemStore('artists', 60, 2)
+    store.set_many({f'id{i}': i for i in range(cache_backend.SQLITE_BATCH + 5)})
+    assert len(store.get_many(f'id{i}' for i in range(cache_backend.SQLITE_BATCH + 10))) == cache_backend.SQLITE_BATCH + 5
+
+    store.set_many({'old': 1, 'a': 1, 'b': 2, 'c': 3})
+    store._db().execute('UPDATE entries SET stored_at = stored_at - 120 WHERE key = ?', ('old',))
+    assert store.get_many(['old']) == {}  # Expired entries are misses before any save
+
+    time.sleep(0.01)
+    store.get_many(['a'])  # Most recently used survives the trim
+    time.sleep(0.01)
+    store.set_many({'d': 4})
+    store.save()
+    assert store.get_many(['a', 'b', 'c', 'd', 'old']).keys() == {'a', 'd'}
+    assert store.size() == 2
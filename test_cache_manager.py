@@ -0,0 +1,24 @@
+import os
+import time
+
+import cache_manager
+from cache_manager import CacheManager
+
+def write(path, size, age):
+    with open(path, 'w') as f:
+        f.write('x' * size)
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+def test_budget_eviction_keeps_tokens_until_max_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(cache_manager, 'ACCESS_FILE', str(tmp_path / '_access.json'))
+    monkeypatch.setattr(cache_manager, 'SESSION_DIR', str(tmp_path / 'sessions'))
+    for user_id, age in [('old', 300), ('new', 100)]:
+        write(tmp_path / f'{user_id}.json', 100, age)
+        write(tmp_path / f'{user_id}_token.json', 10, age)
+    write(tmp_path / 'gone_token.json', 10, 1000)
+
+    CacheManager(budget=150, max_age=500).sweep()
+    # Over budget evicts the least recently used library but leaves its token, the idle user loses both
+    assert sorted(os.listdir(tmp_path)) == ['_access.json', 'new.json', 'new_token.json', 'old_token.json']
@@ -0,0 +1,73 @@
+from itertools import permutations
+
+from analysis import genre_matrix
+from genre_map import convert, convert_many, general_genres, subgenre_to_general_genre
+
+def reference_convert(g):
+    # The original if-cascade, kept verbatim as the specification convert() must match
+    if (g not in subgenre_to_general_genre) or (subgenre_to_general_genre[g] == 'Others'):
+        if 'jazz' in g or 'fusion' in g or 'blues' in g:
+            return 'Jazz'
+        if 'funk' in g or 'boogie' in g:
+            return 'Funk'
+        if 'soul' in g or 'r&b' in g or 'disco' in g:
+            return 'RnB/Soul'
+        if 'movie' in g or 'game' in g or 'soundtrack' in g:
+            return 'Soundtracks'
+        if 'rap' in g or 'hip hop' in g or 'boom bap' in g:
+            return 'Hip-Hop'
+        if 'folk' in g or 'country' in g:
+            return 'Country/Folk'
+        if 'grunge' in g or 'rock' in g or 'punk' in g or 'new wave' in g or 'metal' in g:
+            return 'Rock'
+        if 'indie' in g or 'alternative' in g:
+            return 'Indie'
+        if 'avant' in g or 'experimental' in g:
+            return 'Experimental'
+        if 'house' in g or 'trance' in g or 'bass' in g or 'synth' in g or 'techno' in g or 'electro' in g:
+            return 'Electronic'
+        if 'pop' in g:
+            return 'Pop'
+        return 'Others'
+    return subgenre_to_general_genre[g]
+
+KEYWORDS = ['jazz', 'fusion', 'blues', 'funk', 'boogie', 'soul', 'r&b', 'disco', 'movie', 'game', 'soundtrack',
+            'rap', 'hip hop', 'boom bap', 'folk', 'country', 'grunge', 'rock', 'punk', 'new wave', 'metal',
+            'indie', 'alternative', 'avant', 'experimental', 'house', 'trance', 'bass', 'synth', 'techno',
+            'electro', 'pop']
+
+def unmapped_corpus():
+    # Strings missing from the map: every keyword alone, in every ordered pair, glued into words,
+    # overlapping each other, and look-alikes that contain no keyword at all
+    corpus = ['', ' ', 'k-indie', 'trap', 'drum and bass', 'synthwave', 'electropop', 'bassline', 'housewife',
+              'grapefruit', 'rapper', 'trapped', 'popcorn', 'metalcore', 'punkrock', 'boogaloo', 'jaz', 'hiphop',
+              'boom-bap', 'new-wave', 'r & b', 'rnb', 'JAZZ', 'Pop', 'folktronica', 'videogame', 'gamelan',
+              'soulful house', 'disco funk', 'movie jazz', 'alternative rap', 'electro rock', 'avant pop',
+              'techno folk', 'synthpunk', 'trance metal', 'bassoon', 'ukrainian chant', 'klezmer', 'polka']
+    corpus += KEYWORDS
+    for first, second in permutations(KEYWORDS, 2):
+        corpus += [f'{first} {second}', f'{first}{second}', f'nordic {first} {second} revival']
+    return [g for g in corpus if g not in subgenre_to_general_genre or subgenre_to_general_genre[g] == 'Others']
+
+def test_every_mapped_genre_matches_reference():
+    for g in subgenre_to_general_genre:
+        assert convert(g) == reference_convert(g), g
+
+def test_unmapped_genres_match_reference():
+    corpus = unmapped_corpus()
+    assert len(corpus) > 2500
+    for g in corpus:
+        assert convert(g) == reference_convert(g), g
+
+def test_convert_many_matches_convert():
+    genres = list(subgenre_to_general_genre) + unmapped_corpus()
+    assert convert_many(genres) == [reference_convert(g) for g in genres]
+    assert convert_many([]) == []
+
+def test_every_mapped_value_is_a_general_genre():
+    assert set(subgenre_to_general_genre.values()) <= set(general_genres)
+
+def test_unknown_general_genre_counts_as_others():
+    matrix = genre_matrix([{'genres': ['Indie', 'Folk']}, {'genres': []}])
+    assert matrix[0].tolist() == [genre in ('Indie', 'Others') for genre in general_genres]
+    assert not matrix[1].any()
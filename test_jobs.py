@@ -0,0 +1,17 @@
+import jobs
+from jobs import JobRegistry
+
+def test_finished_jobs_are_pruned_after_ttl(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_PRUNE_INTERVAL', 0)
+    registry = JobRegistry(ttl=60)
+    registry.start('done', 'get_tracks')
+    registry.update('done', 'get_tracks', state='completed')
+    registry.start('running', 'get_tracks')
+    registry.update('running', 'get_tracks', state='running')
+    for job in registry._jobs.values():
+        job['updated_at'] -= 120
+
+    registry.start('new', 'analyze_tracks')
+    assert registry.get('done', 'get_tracks') is None
+    assert registry.get('running', 'get_tracks')['state'] == 'running'
+    assert registry.get('new', 'analyze_tracks')['state'] == 'pending'
@@ -0,0 +1,17 @@
+from library_store import NUMERIC_COLUMNS, STRING_COLUMNS, open_library, write_library
+
+def record(track_id, genres):
+    track = {name: f'{name} {track_id}' for name in STRING_COLUMNS}
+    track.update({name: 0 for name in NUMERIC_COLUMNS})
+    track.update(id=track_id, genres=genres, tempo=120.5, valence=0.123)
+    return track
+
+def test_round_trip(tmp_path):
+    records = [record('a', ['Rock', 'Pop']), record('b', ['Others']), record('c', [])]
+    write_library(str(tmp_path / 'u_AN'), records)
+    assert open_library(str(tmp_path / 'u_AN')).to_records() == records
+
+def test_unknown_genre_label_is_stored_as_others(tmp_path):
+    # Analyses written before the genre map fix contain 'Folk', which is not a general genre
+    write_library(str(tmp_path / 'u_AN'), [record('a', ['Indie', 'Folk'])])
+    assert open_library(str(tmp_path / 'u_AN')).to_records()[0]['genres'] == ['Indie', 'Others']
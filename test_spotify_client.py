@@ -0,0 +1,55 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import spotify_client
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    # Answers the first request with a 429 and every later one with an empty user
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        if type(self).requests == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '7')
+            body = json.dumps({'error': {'status': 429, 'message': 'API rate limit exceeded'}}).encode()
+        else:
+            self.send_response(200)
+            body = json.dumps({'id': 'someone'}).encode()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def api():
+    ThrottlingHandler.requests = 0
+    server = HTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+def test_429_reaches_rate_limited_client(api, monkeypatch):
+    pauses = []
+    monkeypatch.setattr(spotify_client, 'limiter', spotify_client.AdaptiveLimiter(4, 1, 16))
+    monkeypatch.setattr(spotify_client, 'endpoint_stats', spotify_client.EndpointStats())
+    monkeypatch.setattr(spotify_client.bucket, 'pause', pauses.append)
+
+    sp = spotify_client.make_spotify('token')
+    sp.sp.prefix = api
+    assert sp.current_user() == {'id': 'someone'}
+
+    # urllib3 handed the 429 back instead of sleeping through Retry-After, so call() retried it itself
+    assert ThrottlingHandler.requests == 2
+    assert pauses == [7]
+    assert spotify_client.limiter.limit == 2.5  # Halved by the 429, then one additive step
+    stats = spotify_client.endpoint_stats.snapshot()['current_user']
+    assert (stats['calls'], stats['throttled'], stats['errors']) == (2, 1, 0)